@@ -0,0 +1,21 @@
+"""Benchmarks for changelog processing, run from a checkout with::
+
+    python -m benchmarks --help
+
+A synthetic project of changelog files is generated at each of several
+sizes, and the Sphinx build, ``changelog generate-md``,
+:func:`.mdwriter.stream_changelog_sections` and ``changelog
+release-notes`` are timed over each one, reporting changes per second,
+peak memory, and how the time per change grows with the size of the
+project, so that anything worse than linear shows up.
+
+Narrower benchmarks are run on their own, and take ``--against
+<revision>`` to run with the code of another git revision as well,
+comparing both the time taken and the output:
+
+* ``python -m benchmarks.sections``, classifying records into sections
+* ``python -m benchmarks.memory``, the memory held by change records
+* ``python -m benchmarks.markdown``, ``generate-md`` and the markdown
+  translator over one large changelog file
+
+"""
@@ -0,0 +1,71 @@
+"""Run a benchmark with the changelog code of the working tree and,
+optionally, with that of another git revision, to compare the two.
+
+Each run is in a new process, importing ``changelog`` from the working
+tree or from a temporary worktree of the revision.
+
+"""
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def checkout(revision):
+    """Check ``revision`` out into a temporary git worktree, yielding its
+    directory."""
+
+    directory = tempfile.mkdtemp(prefix="changelog-bench-")
+    subprocess.run(
+        ["git", "worktree", "add", "-q", "--detach", directory, revision],
+        cwd=ROOT,
+        check=True,
+    )
+    try:
+        yield directory
+    finally:
+        subprocess.run(
+            ["git", "worktree", "remove", "--force", directory],
+            cwd=ROOT,
+            check=True,
+        )
+
+
+def run(source, path, args):
+    """Run the Python ``source`` in a new process, with ``changelog``
+    imported from ``path``.
+
+    ``source`` is given ``args`` as ``sys.argv[1:]``, followed by the name
+    of a file to which it writes its result as JSON; the result is
+    returned.
+
+    """
+
+    with tempfile.TemporaryDirectory(prefix="changelog-bench-") as workdir:
+        result_filename = os.path.join(workdir, "result.json")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = path
+        subprocess.run(
+            [sys.executable, "-c", source] + list(args) + [result_filename],
+            env=env,
+            cwd=workdir,
+            check=True,
+        )
+        with open(result_filename) as handle:
+            return json.load(handle)
+
+
+def run_against(source, args, revision=None):
+    """Return ``[(label, result), ...]`` from :func:`.run` with the
+    working tree, and with ``revision`` as well if given."""
+
+    results = [("working tree", run(source, ROOT, args))]
+    if revision:
+        with checkout(revision) as directory:
+            results.append((revision, run(source, directory, args)))
+    return results
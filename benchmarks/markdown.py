@@ -0,0 +1,217 @@
+"""Time ``changelog generate-md`` over one large changelog file, run from
+a checkout with::
+
+    python -m benchmarks.markdown [--against <revision>]
+
+The file has many versions of changes whose bodies have nested bullet
+lists, which is where the markdown translator does most of its work.
+It's rendered in full, with ``-s`` and with ``-v`` for one version, and
+the markdown translator is also timed on its own, over the document
+parsed beforehand; with ``--against``, the markdown given by the code
+of that revision is compared byte for byte as well.
+
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from . import compare
+
+_WORDS = (
+    "session query engine connection column table index constraint "
+    "mapper relationship loader dialect cursor statement expression"
+).split()
+
+_TAGS = ["orm", "sql", "engine", "schema", "postgresql", "mysql"]
+
+_CHILD = """
+import contextlib
+import hashlib
+import io
+import json
+import sys
+import time
+
+from docutils.core import publish_doctree
+
+from changelog import cmd
+from changelog import mdwriter
+from changelog.docutils import setup_docutils
+from changelog.environment import DefaultEnvironment
+from changelog.environment import Environment
+
+filename, config_filename, version, repeat, result_filename = sys.argv[1:]
+
+results = {}
+for mode, args in (
+    ("full", []),
+    ("sections", ["-s"]),
+    ("version", ["-v", version]),
+):
+    best = None
+    for i in range(int(repeat)):
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            cmd.main(["generate-md", filename, "-c", config_filename] + args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    data = output.getvalue().encode("utf-8")
+    results[mode] = {
+        "seconds": best,
+        "bytes": len(data),
+        "digest": hashlib.sha1(data).hexdigest(),
+    }
+
+# the markdown translator alone, over a document parsed beforehand
+Environment.register(DefaultEnvironment)
+setup_docutils()
+with open(filename, encoding="utf-8") as handle:
+    doctree = publish_doctree(
+        handle.read(),
+        source_path=filename,
+        settings_overrides={
+            "changelog_env": DefaultEnvironment(config_filename),
+            "report_level": 3,
+        },
+    )
+best = None
+for i in range(int(repeat)):
+    writer = mdwriter.Writer()
+    writer.document = doctree
+    start = time.perf_counter()
+    writer.translate()
+    seconds = time.perf_counter() - start
+    best = seconds if best is None else min(best, seconds)
+data = writer.output.encode("utf-8")
+results["translate"] = {
+    "seconds": best,
+    "bytes": len(data),
+    "digest": hashlib.sha1(data).hexdigest(),
+}
+
+with open(result_filename, "w") as handle:
+    json.dump(results, handle)
+"""
+
+
+def write_changelog(directory, versions=100, changes=40, seed=1):
+    """Write ``changelog.rst`` and ``conf.py`` into ``directory``,
+    returning their filenames and the version in the middle of the
+    file."""
+
+    rnd = random.Random(seed)
+    lines = ["=" * 20, "Changelog", "=" * 20, ""]
+    version_names = ["1.%d.%d" % divmod(n, 20) for n in range(versions)]
+    version_names.reverse()
+    ticket = 1000
+    for number, version in enumerate(version_names):
+        lines.extend(
+            [
+                ".. changelog::",
+                "    :version: %s" % version,
+                "    :released: January %d, 2020" % (number % 28 + 1),
+                "",
+            ]
+        )
+        for i in range(changes):
+            ticket += 1
+            lines.extend(
+                [
+                    "    .. change::",
+                    "        :tags: %s, %s"
+                    % (rnd.choice(_TAGS), rnd.choice(["bug", "feature"])),
+                    "        :tickets: %d" % ticket,
+                    "",
+                ]
+            )
+            lines.extend(
+                "        " + line if line else "" for line in _body(rnd)
+            )
+            lines.append("")
+
+    filename = os.path.join(directory, "changelog.rst")
+    with open(filename, "w") as handle:
+        handle.write("\n".join(lines) + "\n")
+
+    config_filename = os.path.join(directory, "conf.py")
+    with open(config_filename, "w") as handle:
+        handle.write(
+            "changelog_sections = %r\n"
+            "changelog_inner_tag_sort = ['feature', 'bug']\n"
+            "changelog_render_ticket = 'https://example.com/ticket/%%s'\n"
+            "changelog_fragment_cache = False\n" % (_TAGS,)
+        )
+    return filename, config_filename, version_names[versions // 2]
+
+
+def _sentence(rnd):
+    words = [rnd.choice(_WORDS) for i in range(rnd.randint(6, 16))]
+    words[0] = words[0].capitalize()
+    words[rnd.randrange(len(words))] = "``%s``" % rnd.choice(_WORDS)
+    return " ".join(words) + "."
+
+
+def _body(rnd):
+    # a paragraph, then bullets nested three deep
+    lines = [_sentence(rnd), ""]
+    for i in range(rnd.randint(1, 3)):
+        lines.extend(["* " + _sentence(rnd), ""])
+        for j in range(rnd.randint(0, 2)):
+            lines.extend(["  * " + _sentence(rnd), ""])
+            for k in range(rnd.randint(0, 2)):
+                lines.extend(["    * " + _sentence(rnd), ""])
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.markdown",
+        description="Time changelog generate-md over a large changelog file",
+    )
+    parser.add_argument("--versions", type=int, default=100)
+    parser.add_argument("--changes", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="render the file this many times, reporting the fastest",
+    )
+    parser.add_argument(
+        "--against",
+        metavar="REVISION",
+        help="also run with the code of this git revision, comparing the "
+        "time taken and the markdown written",
+    )
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="changelog-bench-") as directory:
+        filename, config_filename, version = write_changelog(
+            directory, options.versions, options.changes, options.seed
+        )
+        results = compare.run_against(
+            _CHILD,
+            [filename, config_filename, version, str(options.repeat)],
+            options.against,
+        )
+
+    first = results[0][1]
+    for mode in ("full", "sections", "version", "translate"):
+        for label, result in results:
+            same = result[mode]["digest"] == first[mode]["digest"]
+            print(
+                "%-9s %-20s %8.3fs %10d bytes  %s"
+                % (
+                    mode,
+                    label,
+                    result[mode]["seconds"],
+                    result[mode]["bytes"],
+                    "identical" if same else "MARKDOWN DIFFERS",
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measure the memory held by change records, run from a checkout with::
+
+    python -m benchmarks.memory [--against <revision>]
+
+Synthetic changes are added with :meth:`.ChangeDirective.add_change`, a
+quarter of them backported to two more versions, and the memory still
+allocated afterwards is measured with tracemalloc, leaving out the
+change bodies and options, which are made beforehand.   The records are
+then dropped, and the number of interned tag and ticket sets left over
+is reported as well.
+
+``--against`` needs a revision which has ``add_change()``.
+
+"""
+import argparse
+
+from . import compare
+
+_CHILD = """
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from docutils import nodes
+
+from changelog.docutils import ChangeDirective
+from changelog.environment import DefaultEnvironment
+
+count, seed, result_filename = sys.argv[1:]
+count = int(count)
+
+words = (
+    "session query engine connection column table index constraint "
+    "mapper relationship loader dialect cursor statement expression"
+).split()
+tags = ["orm", "sql", "engine", "schema", "postgresql", "mysql", "sqlite"]
+inner_tags = ["feature", "bug", "usecase", "performance"]
+versions = [
+    "1.%d.%d" % (minor, patch) for minor in range(4) for patch in range(25)
+]
+
+rnd = random.Random(int(seed))
+changes = []
+for i in range(count):
+    text = " ".join(rnd.choice(words) for j in range(rnd.randint(12, 40)))
+    body = nodes.paragraph("", "", nodes.paragraph(text, text))
+    change_tags = rnd.sample(tags, rnd.randint(1, 2))
+    change_tags.append(rnd.choice(inner_tags))
+    options = {"tags": ", ".join(change_tags), "tickets": str(1000 + i)}
+    if rnd.random() < 0.25:
+        options["versions"] = ", ".join(rnd.sample(versions, 2))
+    changes.append((rnd.choice(versions), options, body))
+
+env = DefaultEnvironment()
+gc.collect()
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+for version, options, body in changes:
+    ChangeDirective.add_change(env, version, options, body)
+gc.collect()
+held = tracemalloc.get_traced_memory()[0] - before
+tracemalloc.stop()
+
+records = sum(
+    len(value)
+    for key, value in env.temp_data.items()
+    if key[0] == "ChangeLogDirective_changes"
+)
+
+del env
+gc.collect()
+try:
+    from changelog import records as records_module
+except ImportError:
+    interned = None
+else:
+    interned = len(records_module._interned)
+
+with open(result_filename, "w") as handle:
+    json.dump(
+        {"records": records, "held_kb": held / 1024, "interned": interned},
+        handle,
+    )
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.memory",
+        description="Measure the memory held by the records of synthetic "
+        "changes",
+    )
+    parser.add_argument("--changes", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--against",
+        metavar="REVISION",
+        help="also run with the code of this git revision, comparing the "
+        "memory held",
+    )
+    options = parser.parse_args(argv)
+
+    results = compare.run_against(
+        _CHILD, [str(options.changes), str(options.seed)], options.against
+    )
+    for label, result in results:
+        print(
+            "%-20s %8d records %10.1f MB held   interned sets left: %s"
+            % (
+                label,
+                result["records"],
+                result["held_kb"] / 1024,
+                "-" if result["interned"] is None else result["interned"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Time the changelog build paths over generated projects of increasing
+size.
+
+Each benchmark is run in a new process, so that its peak memory is its
+own and nothing is cached from an earlier run.
+
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import synthetic
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_sphinx(tree, workdir):
+    """Build the project with Sphinx' html builder."""
+
+    from sphinx.cmd.build import build_main
+
+    def run():
+        status = build_main(
+            [
+                "-q",
+                "-E",
+                "-b",
+                "html",
+                tree.directory,
+                os.path.join(workdir, "html"),
+            ]
+        )
+        if status:
+            raise Exception("sphinx-build failed with status %s" % status)
+
+    return run
+
+
+def bench_generate_md(tree, workdir):
+    """Render every changelog file to markdown, as with
+    ``changelog generate-md -o <dir> -j 1``."""
+
+    from changelog import cmd
+    from changelog import mdwriter  # noqa
+
+    argv = (
+        ["generate-md"]
+        + tree.changelog_files
+        + ["-c", tree.conf_filename, "-o", os.path.join(workdir, "md")]
+        + ["-j", "1"]
+    )
+
+    def run():
+        cmd.main(argv)
+
+    return run
+
+
+def bench_stream(tree, workdir):
+    """Stream the sections of every changelog file with
+    :func:`.mdwriter.stream_changelog_sections`."""
+
+    from changelog import mdwriter
+
+    def receive_section(version, text):
+        pass
+
+    def run():
+        for filename in tree.changelog_files:
+            mdwriter.stream_changelog_sections(
+                filename, tree.conf_filename, receive_section
+            )
+
+    return run
+
+
+def bench_release_notes(tree, workdir):
+    """Merge the notes files of every changelog file with
+    ``changelog release-notes``, in a git repository."""
+
+    from changelog import cmd
+
+    repo = os.path.join(workdir, "repo")
+    shutil.copytree(tree.directory, repo)
+    os.chdir(repo)
+    for git_command in (
+        ["init", "-q"],
+        ["add", "."],
+        ["-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+        + ["commit", "-q", "-m", "notes"],
+    ):
+        subprocess.run(["git"] + git_command, check=True)
+
+    targets = [
+        (os.path.relpath(filename, tree.directory), version)
+        for filename, version in zip(
+            tree.changelog_files, tree.unreleased_versions
+        )
+    ]
+
+    def run():
+        for filename, version in targets:
+            cmd.main(["release-notes", filename, version, "January 1, 2021"])
+
+    return run
+
+
+BENCHMARKS = {
+    "sphinx": bench_sphinx,
+    "generate-md": bench_generate_md,
+    "stream": bench_stream,
+    "release-notes": bench_release_notes,
+}
+
+
+def _run_child(name, tree_filename, result_filename):
+    with open(tree_filename) as handle:
+        tree = synthetic.Tree(None)
+        tree.__dict__.update(json.load(handle))
+
+    workdir = tempfile.mkdtemp(prefix="changelog-bench-")
+    try:
+        run = BENCHMARKS[name](tree, workdir)
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+    finally:
+        os.chdir(_ROOT)
+        shutil.rmtree(workdir)
+
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    with open(result_filename, "w") as handle:
+        json.dump({"seconds": seconds, "peak_kb": peak}, handle)
+
+
+def _run(name, tree_filename, verbose):
+    result_filename = tree_filename + ".result"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [_ROOT] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.runner", "--child", name]
+        + [tree_filename, result_filename],
+        env=env,
+        cwd=_ROOT,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if proc.returncode:
+        sys.stderr.write(proc.stderr or "")
+        raise SystemExit("benchmark %s failed" % name)
+    with open(result_filename) as handle:
+        return json.load(handle)
+
+
+def _report_line(result, first):
+    # time per change relative to the smallest project; a benchmark that
+    # scales linearly stays near 1.0
+    growth = (result["seconds"] / result["changes"]) / (
+        first["seconds"] / first["changes"]
+    )
+    return "%-14s %6s %8d %9.3f %10.0f %8.1f %7.2f%s" % (
+        result["benchmark"],
+        result["scale"],
+        result["changes"],
+        result["seconds"],
+        result["changes"] / result["seconds"],
+        result["peak_kb"] / 1024.0,
+        growth,
+        "  <-- superlinear?" if growth > 1.5 else "",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time changelog processing over generated projects, "
+        "reporting how the time per change grows with the project's size",
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmark",
+        action="append",
+        choices=sorted(BENCHMARKS),
+        dest="benchmarks",
+        help="benchmark to run; may be repeated. defaults to all",
+    )
+    parser.add_argument(
+        "--scales",
+        default="1,2,4",
+        help="comma-separated multiples of --scale-by to generate a "
+        "project for; default 1,2,4",
+    )
+    parser.add_argument(
+        "--scale-by",
+        default="versions",
+        choices=["files", "versions", "changes", "notes"],
+        help="the dimension of the project to scale; default versions",
+    )
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=10)
+    parser.add_argument("--backports", type=float, default=0.2)
+    parser.add_argument("--compound-tags", type=float, default=0.3)
+    parser.add_argument("--notes", type=int, default=10)
+    parser.add_argument("--fan-out", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="run each benchmark this many times, reporting the fastest",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument(
+        "--keep",
+        help="generate the projects into this directory and leave them "
+        "there, rather than in a temporary directory",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="show the output of the benchmarked commands",
+    )
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+
+    options = parser.parse_args(argv)
+    if options.child:
+        _run_child(*options.child)
+        return
+
+    names = options.benchmarks or list(BENCHMARKS)
+    basedir = options.keep or tempfile.mkdtemp(prefix="changelog-bench-")
+    results = []
+
+    print(
+        "%-14s %6s %8s %9s %10s %8s %7s"
+        % (
+            "benchmark",
+            "scale",
+            "changes",
+            "seconds",
+            "changes/s",
+            "peak MB",
+            "growth",
+        )
+    )
+    try:
+        trees = []
+        for scale in [int(s) for s in options.scales.split(",")]:
+            kw = dict(
+                files=options.files,
+                versions=options.versions,
+                changes=options.changes,
+                backports=options.backports,
+                compound_tags=options.compound_tags,
+                notes=options.notes,
+                fan_out=options.fan_out,
+                seed=options.seed,
+            )
+            kw[options.scale_by] *= scale
+            directory = os.path.join(basedir, "scale_%d" % scale)
+            tree = synthetic.generate_tree(directory, **kw)
+            tree_filename = os.path.join(basedir, "scale_%d.json" % scale)
+            with open(tree_filename, "w") as handle:
+                json.dump(vars(tree), handle)
+            trees.append((scale, tree, tree_filename))
+
+        for name in names:
+            first = None
+            for scale, tree, tree_filename in trees:
+                runs = [
+                    _run(name, tree_filename, options.verbose)
+                    for i in range(options.repeat)
+                ]
+                result = {
+                    "benchmark": name,
+                    "scale": scale,
+                    "changes": tree.changes,
+                    "lines": tree.lines,
+                    "seconds": min(r["seconds"] for r in runs),
+                    "peak_kb": max(r["peak_kb"] for r in runs),
+                }
+                first = first or result
+                results.append(result)
+                print(_report_line(result, first))
+                sys.stdout.flush()
+    finally:
+        if not options.keep:
+            shutil.rmtree(basedir)
+
+    if options.json:
+        with open(options.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Time the classification of change records into sections by
+:func:`.generate_rst._organize_by_section`, run from a checkout with::
+
+    python -m benchmarks.sections [--against <revision>]
+
+Synthetic records are classified for ``changelog_sections`` and
+``changelog_inner_tag_sort`` lists like SQLAlchemy's.   Each record has
+up to five tags, at most one of them an inner sort tag so that the
+result doesn't depend on the order a set is iterated in, and some have
+a compound section as a single tag, e.g. ``orm declarative``.   With
+``--against``, the sections each record went into are compared with
+those given by the code of that revision.
+
+"""
+import argparse
+import json
+
+from . import compare
+
+SECTIONS = [
+    "general",
+    "platform",
+    "orm",
+    "orm declarative",
+    "orm querying",
+    "orm extensions",
+    "engine",
+    "sql",
+    "schema",
+    "typing",
+    "postgresql",
+    "mysql",
+    "sqlite",
+    "tests",
+]
+
+INNER_TAG_SORT = [
+    "feature",
+    "usecase",
+    "change",
+    "changed",
+    "performance",
+    "bug",
+    "deprecated",
+    "removed",
+    "renamed",
+    "moved",
+]
+
+_OTHER_TAGS = ["asyncio", "regression", "reflection", "py3k", "docs"]
+
+_CHILD = """
+import hashlib
+import json
+import random
+import sys
+import time
+
+from changelog import generate_rst
+
+count, repeat, seed, config, result_filename = sys.argv[1:]
+sections, inner_tag_sort, other_tags = json.loads(config)
+
+words = sorted(
+    set(word for section in sections for word in section.split(" "))
+)
+rnd = random.Random(int(seed))
+records = []
+for i in range(int(count)):
+    tags = rnd.sample(words + other_tags, rnd.randint(0, 3))
+    if rnd.random() < 0.05:
+        # a compound section given as a single tag
+        tags.append(rnd.choice([s for s in sections if " " in s]))
+    if rnd.random() < 0.9:
+        tags.append(rnd.choice(inner_tag_sort))
+    tags = tags or [rnd.choice(other_tags)]
+    records.append(
+        {
+            "index": i,
+            "tags": set(tags),
+            "sorted_tags": tags,
+            "render_for_version": "1.0.0",
+        }
+    )
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class _Env(object):
+    def phase(self, name):
+        return _NullPhase()
+
+    @property
+    def timer(self):
+        return self
+
+
+class _Directive(object):
+    env = _Env()
+    version = "1.0.0"
+    default_section = "misc"
+
+
+directive = _Directive()
+directive.sections = sections
+directive.inner_tag_sort = inner_tag_sort
+
+best = None
+for i in range(int(repeat)):
+    start = time.perf_counter()
+    bysection, all_sections = generate_rst._organize_by_section(
+        directive, records
+    )
+    seconds = time.perf_counter() - start
+    best = seconds if best is None else min(best, seconds)
+
+classified = sorted(
+    (rec["index"], section, inner_tag)
+    for (section, inner_tag), recs in bysection.items()
+    for rec in recs
+)
+counts = {}
+for (section, inner_tag), recs in bysection.items():
+    counts[section] = counts.get(section, 0) + len(recs)
+
+with open(result_filename, "w") as handle:
+    json.dump(
+        {
+            "seconds": best,
+            "digest": hashlib.sha1(repr(classified).encode()).hexdigest(),
+            "sections": counts,
+        },
+        handle,
+    )
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.sections",
+        description="Time the classification of synthetic change records "
+        "into sections",
+    )
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="classify the records this many times, reporting the fastest",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--against",
+        metavar="REVISION",
+        help="also run with the code of this git revision, comparing the "
+        "time taken and the sections given to each record",
+    )
+    options = parser.parse_args(argv)
+
+    config = json.dumps([SECTIONS, INNER_TAG_SORT, _OTHER_TAGS])
+    results = compare.run_against(
+        _CHILD,
+        [str(options.records), str(options.repeat), str(options.seed)]
+        + [config],
+        options.against,
+    )
+
+    first = results[0][1]
+    for label, result in results:
+        same = result["digest"] == first["digest"]
+        print(
+            "%-20s %8.3fs  %s"
+            % (
+                label,
+                result["seconds"],
+                "same sections" if same else "SECTIONS DIFFER",
+            )
+        )
+        if not same:
+            for section in sorted(
+                set(first["sections"]) | set(result["sections"])
+            ):
+                counts = [
+                    r["sections"].get(section, 0) for r in (first, result)
+                ]
+                if counts[0] != counts[1]:
+                    print(
+                        "    %-20s %8d %8d" % (section, counts[0], counts[1])
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Generate a synthetic Sphinx project of changelog files.
+
+The project is laid out the way SQLAlchemy's is: one changelog file per
+release series, newest first, each older series importing the changes of
+the newer ones with ``.. changelog_imports::`` so that backports show up
+in both; the unreleased version of each series takes its changes from a
+directory of notes files.
+
+"""
+import os
+import random
+
+SECTIONS = [
+    "general",
+    "orm",
+    "orm declarative",
+    "orm querying",
+    "engine",
+    "sql",
+    "schema",
+    "postgresql",
+    "mysql",
+    "sqlite",
+    "tests",
+]
+
+INNER_TAG_SORT = ["feature", "usecase", "change", "performance", "bug"]
+
+_WORDS = (
+    "session query engine connection column table index constraint "
+    "mapper relationship loader dialect cursor statement expression "
+    "parameter result row identity flush cache"
+).split()
+
+
+class Tree(object):
+    """A generated project; see :func:`.generate_tree`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.changelog_files = []
+        self.notes_dirs = []
+        self.unreleased_versions = []
+        self.changes = 0
+        self.lines = 0
+
+    @property
+    def conf_filename(self):
+        return os.path.join(self.directory, "conf.py")
+
+
+def generate_tree(
+    directory,
+    files=3,
+    versions=10,
+    changes=10,
+    backports=0.2,
+    compound_tags=0.3,
+    notes=10,
+    fan_out=2,
+    seed=1,
+):
+    """Write a project of changelog files into ``directory``, returning a
+    :class:`.Tree` describing it.
+
+    :param files: number of changelog files, i.e. release series.
+    :param versions: number of versions in each file.
+    :param changes: number of changes in each released version.
+    :param backports: fraction of changes which also apply to a version
+     of an older series, with ``:versions:``.
+    :param compound_tags: chance that a change in one of the sections
+     named by two tags, such as ``orm declarative``, has both of them
+     rather than only the first.
+    :param notes: number of notes files for the unreleased version of
+     each series, in its ``:include_notes_from:`` directory.
+    :param fan_out: number of newer files each file imports with
+     ``.. changelog_imports::``.
+    :param seed: seed for the random choice of tags, tickets and
+     backports, so that the same arguments give the same project.
+
+    """
+
+    rnd = random.Random(seed)
+    tree = Tree(directory)
+    changelog_dir = os.path.join(directory, "changelog")
+    os.makedirs(changelog_dir, exist_ok=True)
+
+    # series "1.<files>" is the newest, in file 0
+    series = ["1.%d" % (files - idx) for idx in range(files)]
+    names = ["changelog_%s" % s.replace(".", "") for s in series]
+    all_versions = [
+        ["%s.%d" % (s, patch) for patch in reversed(range(versions))]
+        for s in series
+    ]
+
+    ticket = iter(range(1000, 10**9))
+
+    for idx, name in enumerate(names):
+        older = [
+            version
+            for older_versions in all_versions[idx + 1 : idx + 1 + fan_out]
+            for version in older_versions
+        ]
+
+        def change(indent):
+            tree.changes += 1
+            return _change(
+                rnd, indent, next(ticket), older, backports, compound_tags
+            )
+
+        lines = ["=" * 20, "Changelog %s" % series[idx], "=" * 20, ""]
+
+        newer = names[max(0, idx - fan_out) : idx]
+        if newer:
+            lines.extend([".. changelog_imports::", ""])
+            for newer_name in newer:
+                lines.extend(
+                    [
+                        "    .. include:: %s.rst" % newer_name,
+                        "        :start-line: 4",
+                        "",
+                    ]
+                )
+
+        for number, version in enumerate(all_versions[idx]):
+            lines.extend([".. changelog::", "    :version: %s" % version])
+            if number == 0 and notes:
+                notes_name = "unreleased_%s" % series[idx].replace(".", "")
+                notes_dir = os.path.join(changelog_dir, notes_name)
+                os.makedirs(notes_dir, exist_ok=True)
+                for note in range(notes):
+                    with open(
+                        os.path.join(notes_dir, "%d.rst" % next(ticket)), "w"
+                    ) as handle:
+                        note_lines = change("")
+                        tree.lines += len(note_lines)
+                        handle.write("\n".join(note_lines) + "\n")
+                lines.append("    :include_notes_from: %s" % notes_name)
+                tree.notes_dirs.append(notes_dir)
+                tree.unreleased_versions.append(version)
+            else:
+                lines.append("    :released: January %d, 2020" % (number + 1))
+                lines.append("")
+                for i in range(changes):
+                    lines.extend(change("    "))
+                    lines.append("")
+            lines.append("")
+
+        filename = os.path.join(changelog_dir, name + ".rst")
+        with open(filename, "w") as handle:
+            handle.write("\n".join(lines) + "\n")
+        tree.changelog_files.append(filename)
+        tree.lines += len(lines)
+
+    with open(os.path.join(directory, "conf.py"), "w") as handle:
+        handle.write(
+            "extensions = ['changelog']\n"
+            "master_doc = 'index'\n"
+            "exclude_patterns = ['changelog/unreleased_*']\n"
+            "changelog_sections = %r\n"
+            "changelog_inner_tag_sort = %r\n"
+            "changelog_render_ticket = 'https://example.com/ticket/%%s'\n"
+            "changelog_fragment_cache = False\n" % (SECTIONS, INNER_TAG_SORT)
+        )
+
+    with open(os.path.join(directory, "index.rst"), "w") as handle:
+        handle.write("Changelog\n=========\n\n.. toctree::\n\n")
+        for name in names:
+            handle.write("   changelog/%s\n" % name)
+
+    return tree
+
+
+def _change(rnd, indent, ticket, older, backports, compound_tags):
+    # the lines of a .. change:: directive
+    lines = [
+        ".. change::",
+        "    :tags: %s" % ", ".join(_tags(rnd, compound_tags)),
+        "    :tickets: %d" % ticket,
+    ]
+    if older and rnd.random() < backports:
+        lines.append("    :versions: %s" % rnd.choice(older))
+    lines.append("")
+    lines.extend("    " + line for line in _text(rnd))
+    return [indent + line if line else "" for line in lines]
+
+
+def _tags(rnd, compound_tags):
+    section = rnd.choice(SECTIONS)
+    if " " in section and rnd.random() >= compound_tags:
+        section = section.split(" ")[0]
+    tags = section.split(" ")
+    tags.append(rnd.choice(INNER_TAG_SORT))
+    return tags
+
+
+def _text(rnd):
+    words = [rnd.choice(_WORDS) for i in range(rnd.randint(12, 40))]
+    words[0] = words[0].capitalize()
+    words[rnd.randrange(len(words))] = "``%s``" % rnd.choice(_WORDS)
+    words[rnd.randrange(len(words))] = ":class:`.%s`" % (
+        rnd.choice(_WORDS).capitalize()
+    )
+    lines = []
+    for start in range(0, len(words), 10):
+        lines.append(" ".join(words[start : start + 10]))
+    lines[-1] += "."
+    return lines
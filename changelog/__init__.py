@@ -1,3 +1,8 @@
 __version__ = "0.6.3"
 
-from .sphinxext import setup  # noqa
+
+def setup(app):
+    # imported here so that the "changelog" command doesn't import Sphinx
+    from .sphinxext import setup
+
+    return setup(app)
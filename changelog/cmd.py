@@ -1,31 +1,37 @@
 import argparse
+import glob
 import os
 import re
 import shutil
+import subprocess
 import sys
 import tempfile
 
-from . import mdwriter
+from . import scanner
 
 
-def release_notes_into_changelog_file(target_filename, version, release_date):
+def release_notes_into_changelog_file(
+    target_filename, version, release_date, dry_run=False
+):
     """Read changelog fragment files and render them into a single .rst file.
 
-    remove the fragment files afterwards using git rm.
+    remove the fragment files afterwards using git rm; any that git
+    doesn't track are deleted, with a warning.
 
     The fragment files are located by looking for ':include_notes_from:'
-    directives in the given changelog file.
+    directives in the given changelog file, and are read in order of
+    filename.   With ``dry_run``, the merged changelog is printed rather
+    than written, and no files are removed.
 
     """
-    output = tempfile.NamedTemporaryFile(
-        mode="w", delete=False, encoding="utf-8"
-    )
-    with open(target_filename) as handle:
+    output = []
+    fragments = []
+    with open(target_filename, encoding="utf-8") as handle:
         for line in handle:
             m = re.match(r".*:version: %s" % version, line)
             if m:
-                output.write(line)
-                output.write("    :released: %s\n" % release_date)
+                output.append(line)
+                output.append("    :released: %s\n" % release_date)
                 continue
 
             m = re.match(r".*:include_notes_from: (.+)", line)
@@ -33,67 +39,350 @@ def release_notes_into_changelog_file(target_filename, version, release_date):
                 notes_dir = os.path.join(
                     os.path.dirname(target_filename), m.group(1)
                 )
-                for fname in os.listdir(notes_dir):
+                for fname in sorted(os.listdir(notes_dir)):
                     if not fname.endswith(".rst"):
                         continue
                     fname_path = os.path.join(notes_dir, fname)
-                    output.write("\n")
-                    with open(fname_path) as inner:
+                    output.append("\n")
+                    with open(fname_path, encoding="utf-8") as inner:
                         for inner_line in inner:
-                            output.write(("    " + inner_line).rstrip() + "\n")
-                    os.system("git rm %s" % fname_path)
+                            output.append(
+                                ("    " + inner_line).rstrip() + "\n"
+                            )
+                    fragments.append(fname_path)
             else:
-                output.write(line)
-    output.close()
-    shutil.move(output.name, target_filename)
+                output.append(line)
+
+    if dry_run:
+        sys.stdout.write("".join(output))
+        return
+
+    # find out what git will remove before the changelog is written, so
+    # that a failure doesn't leave the notes merged but still in place
+    tracked = _tracked_by_git(fragments)
+
+    with tempfile.NamedTemporaryFile(
+        mode="w", delete=False, encoding="utf-8"
+    ) as handle:
+        handle.write("".join(output))
+    shutil.move(handle.name, target_filename)
+
+    untracked = [
+        fname for fname in fragments if os.path.abspath(fname) not in tracked
+    ]
+    for fname in untracked:
+        sys.stderr.write(
+            "release-notes: warning: %s is not tracked by git, "
+            "removing it\n" % fname
+        )
+        os.remove(fname)
+
+    committed = [fname for fname in fragments if fname not in untracked]
+    if committed:
+        # the notes as they are on disk have been merged, so local
+        # modifications don't stop them from being removed
+        subprocess.run(["git", "rm", "-q", "-f", "--"] + committed, check=True)
+
+
+def _tracked_by_git(fnames):
+    """Return the absolute paths of those of ``fnames`` which are
+    tracked by git, exiting if git can't tell us."""
+
+    if not fnames:
+        return set()
+    result = subprocess.run(
+        ["git", "ls-files", "-z", "--"] + fnames,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode:
+        sys.exit(
+            "release-notes: error: can't list the notes files in git: %s"
+            % result.stderr.strip()
+        )
+    return set(
+        os.path.abspath(fname) for fname in result.stdout.split("\0") if fname
+    )
+
+
+def generate_md(
+    filenames,
+    config_filename,
+    version,
+    sections_only,
+    since,
+    until,
+    output_dir,
+    jobs,
+):
+    """Render one changelog file to stdout, or any number of them into
+    an output directory."""
+
+    from . import mdwriter
+
+    target_filenames = []
+    for filename in filenames:
+        if glob.has_magic(filename):
+            matched = sorted(glob.glob(filename))
+            if not matched:
+                sys.exit("generate-md: error: no files matched %s" % filename)
+            target_filenames.extend(matched)
+        else:
+            target_filenames.append(filename)
+
+    if output_dir is None:
+        if len(target_filenames) != 1:
+            sys.exit(
+                "generate-md: error: rendering %d files requires "
+                "--output-dir" % len(target_filenames)
+            )
+        mdwriter.render_changelog_as_md(
+            target_filenames[0],
+            config_filename,
+            version,
+            sections_only,
+            since=since,
+            until=until,
+        )
+    else:
+        mdwriter.render_changelog_files_as_md(
+            target_filenames,
+            config_filename,
+            output_dir,
+            version=version,
+            sections_only=sections_only,
+            since=since,
+            until=until,
+            jobs=jobs,
+        )
+
+
+def generate_json(filename, config_filename, since, until):
+    """Write the change records of one changelog file to stdout as
+    newline-delimited JSON."""
+
+    from . import jsonwriter
+
+    jsonwriter.render_changelog_as_json(
+        filename, config_filename, since=since, until=until
+    )
+
+
+def query_changelog_files(filenames, since, until, tags, tickets, released):
+    """Print the changes in the given changelog files which match the
+    given criteria, one per line."""
+
+    for change, versions in scanner.query(
+        filenames,
+        since=since,
+        until=until,
+        tags=tags or (),
+        tickets=tickets or (),
+        released=released,
+    ):
+        print(
+            "%s %s:%d %s%s %s"
+            % (
+                ", ".join(versions),
+                change.filename,
+                change.lineno,
+                " ".join("[%s]" % tag for tag in sorted(change.tags)),
+                "".join(" #%s" % ticket for ticket in sorted(change.tickets)),
+                change.summary,
+            )
+        )
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser()
-    subparsers = parser.add_subparsers()
+    subparsers = parser.add_subparsers(dest="command")
+
+    # options accepted by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--profile",
+        metavar="DIRECTORY",
+        help="write cProfile and tracemalloc reports for the run into "
+        "this directory; with --jobs, only the main process is profiled",
+    )
 
     subparser = subparsers.add_parser(
-        "release-notes", help="Merge notes files into changelog and git rm"
+        "release-notes",
+        help="Merge notes files into changelog and git rm",
+        parents=[common],
     )
     subparser.add_argument("filename", help="target changelog filename")
     subparser.add_argument(
         "version", help="version string as it appears in changelog"
     )
     subparser.add_argument("date", help="full text of datestamp to insert")
+    subparser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the merged changelog rather than writing it, and "
+        "don't remove the notes files",
+    )
     subparser.set_defaults(
         cmd=(
             release_notes_into_changelog_file,
-            ["filename", "version", "date"],
+            ["filename", "version", "date", "dry_run"],
         )
     )
 
     subparser = subparsers.add_parser(
-        "generate-md", help="Generate file into markdown"
+        "generate-md", help="Generate file into markdown", parents=[common]
+    )
+    subparser.add_argument(
+        "filenames",
+        nargs="+",
+        help="target changelog filename(s) or glob pattern(s); more than "
+        "one requires --output-dir",
+    )
+    subparser.add_argument(
+        "-c",
+        "--config",
+        help="path to conf.py, or to a setup.cfg style file with a "
+        "[changelog] section",
     )
-    subparser.add_argument("filename", help="target changelog filename")
-    subparser.add_argument("-c", "--config", help="path to conf.py")
     subparser.add_argument(
         "-v",
         "--version",
         type=str,
         help="render changelog only for version given",
     )
+    subparser.add_argument(
+        "-o",
+        "--output-dir",
+        help="write a .md file for each changelog file into this "
+        "directory, rather than to stdout",
+    )
+    subparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of processes rendering files at once with "
+        "--output-dir; defaults to the number of CPUs",
+    )
     subparser.add_argument(
         "-s",
         "--sections-only",
         action="store_true",
         help="render changelogs as top level sections",
     )
+    subparser.add_argument(
+        "--since",
+        help="render changelog only for versions at or after the "
+        "version given",
+    )
+    subparser.add_argument(
+        "--until",
+        help="render changelog only for versions at or before the "
+        "version given; e.g. 1.4 includes all 1.4.x versions",
+    )
+    subparser.set_defaults(
+        cmd=(
+            generate_md,
+            [
+                "filenames",
+                "config",
+                "version",
+                "sections_only",
+                "since",
+                "until",
+                "output_dir",
+                "jobs",
+            ],
+        )
+    )
+
+    subparser = subparsers.add_parser(
+        "generate-json",
+        help="Write the change records of a file as newline-delimited JSON",
+        parents=[common],
+    )
+    subparser.add_argument("filename", help="target changelog filename")
+    subparser.add_argument(
+        "-c",
+        "--config",
+        help="path to conf.py, or to a setup.cfg style file with a "
+        "[changelog] section",
+    )
+    subparser.add_argument(
+        "--since", help="only versions at or after the version given"
+    )
+    subparser.add_argument(
+        "--until",
+        help="only versions at or before the version given; "
+        "e.g. 1.4 includes all 1.4.x versions",
+    )
     subparser.set_defaults(
         cmd=(
-            mdwriter.render_changelog_as_md,
-            ["filename", "config", "version", "sections_only"],
+            generate_json,
+            ["filename", "config", "since", "until"],
+        )
+    )
+
+    subparser = subparsers.add_parser(
+        "query",
+        help="List changes by version, tag, ticket or release status, "
+        "without rendering",
+        parents=[common],
+    )
+    subparser.add_argument(
+        "filenames", nargs="+", help="changelog filenames to search"
+    )
+    subparser.add_argument(
+        "--since", help="only versions at or after the version given"
+    )
+    subparser.add_argument(
+        "--until",
+        help="only versions at or before the version given; "
+        "e.g. 1.4 includes all 1.4.x versions",
+    )
+    subparser.add_argument(
+        "-t",
+        "--tag",
+        action="append",
+        dest="tags",
+        help="only changes with the tag given; may be repeated",
+    )
+    subparser.add_argument(
+        "--ticket",
+        action="append",
+        dest="tickets",
+        help="only changes with the ticket given; may be repeated",
+    )
+    released = subparser.add_mutually_exclusive_group()
+    released.add_argument(
+        "--released",
+        action="store_const",
+        const=True,
+        help="only versions which have been released",
+    )
+    released.add_argument(
+        "--unreleased",
+        action="store_const",
+        const=False,
+        dest="released",
+        help="only versions which have not been released",
+    )
+    subparser.set_defaults(
+        cmd=(
+            query_changelog_files,
+            ["filenames", "since", "until", "tags", "tickets", "released"],
         )
     )
 
     options = parser.parse_args(argv)
     fn, argnames = options.cmd
-    fn(*[getattr(options, name) for name in argnames])
+    args = [getattr(options, name) for name in argnames]
+    if options.profile:
+        from . import profiling
+
+        profiling.run_profiled(options.profile, options.command, fn, *args)
+    else:
+        fn(*args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+"""Read the ``changelog_*`` settings used outside of Sphinx, from a Sphinx
+``conf.py`` or from the ``[changelog]`` section of a ``setup.cfg`` style
+file.
+
+"""
+import ast
+import configparser
+import hashlib
+import logging
+import re
+
+LOG = logging.getLogger(__name__)
+
+_PREFIX = "changelog_"
+
+# settings given as a list, which in a .cfg file may be written one per
+# line or separated by commas
+_LIST_SETTINGS = frozenset(["changelog_sections", "changelog_inner_tag_sort"])
+
+# names that let a conf.py set or change settings in ways that can't be
+# seen from its source
+_DYNAMIC_NAMES = frozenset(["exec", "eval", "globals", "locals", "vars"])
+
+_cache = {}
+
+
+def read_config(filename):
+    """Return a dictionary of the ``changelog_*`` settings in the given
+    file.
+
+    A ``.py`` file is read as a Sphinx ``conf.py``.   When each of its
+    ``changelog_*`` settings is a plain assignment of a literal at the top
+    level of the file, these are read from its source without running it,
+    so that whatever else it imports isn't; otherwise the whole file is
+    executed, as Sphinx does.
+
+    Any other file is read as a ``setup.cfg`` style file with a
+    ``[changelog]`` section, in which settings are named without their
+    ``changelog_`` prefix, e.g.::
+
+        [changelog]
+        sections = general, orm, orm declarative
+        inner_tag_sort = feature, bug
+        render_ticket = https://example.com/ticket/%s
+
+    Values that are Python literals are read as such; list settings may
+    otherwise be given one per line or separated by commas.
+
+    Settings read without executing anything are kept for the life of the
+    process, keyed on the digest of the file's contents.
+
+    """
+
+    with open(filename, "rb") as handle:
+        source = handle.read()
+    is_python = filename.endswith(".py")
+    key = (is_python, hashlib.sha1(source).hexdigest())
+    if key in _cache:
+        return dict(_cache[key])
+
+    if is_python:
+        settings = _literal_settings(source, filename)
+        if settings is None:
+            LOG.debug(
+                "changelog settings in %s aren't all literals; "
+                "executing the file",
+                filename,
+            )
+            # not cached, as the results may depend on other files
+            return _exec_settings(source, filename)
+    else:
+        settings = _cfg_settings(source.decode("utf-8-sig"), filename)
+
+    _cache[key] = settings
+    return dict(settings)
+
+
+def _literal_settings(source, filename):
+    tree = ast.parse(source, filename)
+
+    settings = {}
+    assigned = set()
+    for stmt in tree.body:
+        if not isinstance(stmt, ast.Assign) or not all(
+            isinstance(target, ast.Name) for target in stmt.targets
+        ):
+            continue
+        names = [
+            target.id
+            for target in stmt.targets
+            if target.id.startswith(_PREFIX)
+        ]
+        if not names:
+            continue
+        try:
+            value = ast.literal_eval(stmt.value)
+        except (ValueError, TypeError):
+            return None
+        for name in names:
+            settings[name] = value
+        assigned.update(stmt.targets)
+
+    # any other use of a setting's name, such as a conditional assignment
+    # or changelog_sections.append(), means the literals aren't the whole
+    # story
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id in _DYNAMIC_NAMES or (
+                node.id.startswith(_PREFIX) and node not in assigned
+            ):
+                return None
+        elif isinstance(node, ast.ImportFrom):
+            if any(alias.name == "*" for alias in node.names):
+                return None
+        elif isinstance(node, ast.Import):
+            if any(
+                (alias.asname or alias.name).startswith(_PREFIX)
+                for alias in node.names
+            ):
+                return None
+
+    return settings
+
+
+def _exec_settings(source, filename):
+    namespace = {"__file__": filename}
+    exec(compile(source, filename, "exec"), namespace)
+    return {
+        name: value
+        for name, value in namespace.items()
+        if name.startswith(_PREFIX)
+    }
+
+
+def _cfg_settings(text, filename):
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read_string(text, filename)
+    if not parser.has_section("changelog"):
+        raise ValueError("%s has no [changelog] section" % filename)
+
+    return {
+        _PREFIX + name: _cfg_value(_PREFIX + name, value)
+        for name, value in parser.items("changelog")
+    }
+
+
+def _cfg_value(name, value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, TypeError, SyntaxError):
+        pass
+
+    if name in _LIST_SETTINGS:
+        return [
+            item for item in re.split(r"\s*[,\n]\s*", value.strip()) if item
+        ]
+
+    boolean = configparser.ConfigParser.BOOLEAN_STATES.get(value.lower())
+    if boolean is not None:
+        return boolean
+    return value
@@ -0,0 +1,138 @@
+"""Deliver per-version markdown sections to an async callable, such as one
+that posts them to a release hosting API.
+
+"""
+import asyncio
+import logging
+import time
+
+from . import mdwriter
+
+LOG = logging.getLogger(__name__)
+
+_done = object()
+
+
+class SectionDelivery(object):
+    """The outcome of delivering one changelog section."""
+
+    __slots__ = ("version", "attempts", "latency", "error")
+
+    def __init__(self, version):
+        self.version = version
+        self.attempts = 0
+
+        # seconds from the section being rendered until it was delivered,
+        # or until the last attempt failed
+        self.latency = None
+
+        # the exception from the last attempt, if they all failed
+        self.error = None
+
+    @property
+    def delivered(self):
+        return self.attempts > 0 and self.error is None
+
+    def __repr__(self):
+        return "SectionDelivery(%r, attempts=%d, latency=%r, error=%r)" % (
+            self.version,
+            self.attempts,
+            self.latency,
+            self.error,
+        )
+
+
+async def deliver_changelog_sections(
+    target_filename,
+    config_filename,
+    send_section,
+    concurrency=4,
+    retries=3,
+    retry_delay=1.0,
+    since=None,
+    until=None,
+):
+    """Render each changelog section and send it to an async callable, one
+    per version.
+
+    ``send_section`` is awaited with two arguments, the string version
+    number and the markdown-formatted content of the section, as for
+    :func:`.mdwriter.stream_changelog_sections`.
+
+    Sections are rendered in a worker thread while earlier ones are being
+    sent.   At most ``concurrency`` sends are in progress at once, and
+    rendering waits once that many sections are waiting to be sent.   A
+    send that raises an exception is tried again up to ``retries`` more
+    times, waiting ``retry_delay`` seconds before the first retry and
+    twice as long before each one after that.
+
+    Returns a list of :class:`.SectionDelivery`, in the order of the
+    file; a section that couldn't be delivered has its last exception as
+    ``error``, and doesn't stop the others from being sent.
+
+    """
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=concurrency)
+    deliveries = []
+
+    async def render():
+        sections = mdwriter.iter_changelog_sections(
+            target_filename, config_filename, since=since, until=until
+        )
+        try:
+            while True:
+                section = await loop.run_in_executor(
+                    None, next, sections, _done
+                )
+                if section is _done:
+                    break
+                version, text = section
+                delivery = SectionDelivery(version)
+                deliveries.append(delivery)
+                await queue.put((delivery, text, time.perf_counter()))
+        finally:
+            await loop.run_in_executor(None, sections.close)
+            for i in range(concurrency):
+                await queue.put(None)
+
+    async def send():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            delivery, text, rendered = item
+            await _send(delivery, text, rendered)
+
+    async def _send(delivery, text, rendered):
+        delay = retry_delay
+        while True:
+            delivery.attempts += 1
+            try:
+                await send_section(delivery.version, text)
+            except Exception as err:
+                if delivery.attempts > retries:
+                    delivery.error = err
+                    break
+                LOG.debug(
+                    "retrying changelog section %s after attempt %d: %s",
+                    delivery.version,
+                    delivery.attempts,
+                    err,
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                break
+
+        delivery.latency = time.perf_counter() - rendered
+        LOG.debug(
+            "changelog section %s %s in %.3fs after %d attempt(s)",
+            delivery.version,
+            "failed" if delivery.error else "delivered",
+            delivery.latency,
+            delivery.attempts,
+        )
+
+    await asyncio.gather(render(), *[send() for i in range(concurrency)])
+    return deliveries
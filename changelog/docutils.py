@@ -2,41 +2,29 @@ import collections
 import hashlib as md5
 import os
 import re
-import sys
-import warnings
 
 from docutils import nodes
 from docutils.parsers.rst import Directive
 from docutils.parsers.rst import directives
 from docutils.parsers.rst import roles
-from looseversion import LooseVersion
+from docutils.statemachine import StringList
 
+from . import fragments
 from . import generate_rst
+from . import imports
+from . import records
+from . import scanner
+from . import versionkey
 from .environment import Environment
 
-py3k = sys.version_info >= (3, 0)
-
 
 def _comma_list(text):
     return re.split(r"\s*,\s*", text.strip())
 
 
 def _parse_content(content):
-    d = {}
-    d["text"] = []
-    idx = 0
-    for line in content:
-        idx += 1
-        m = re.match(r" *\:(.+?)\:(?: +(.+))?", line)
-        if m:
-            attrname, value = m.group(1, 2)
-            d[attrname] = value or ""
-        elif idx == 1 and line:
-            # accomodate a unique value on the edge of .. change::
-            continue
-        else:
-            break
-    d["text"] = content[idx:]
+    d, text = scanner.parse_options(content)
+    d["text"] = text
     return d
 
 
@@ -64,7 +52,28 @@ class ChangeLogDirective(EnvDirective, Directive):
         self._parse()
 
         if not ChangeLogImportDirective.in_include_directive(self.env):
-            return generate_rst.render_changelog(self)
+            changes = self.get_changes_list(self.env, self.version)
+            timer = self.env.timer
+
+            # the text of each change, before rendering adds to its body
+            texts = {}
+            if self.env.changelog_record_text:
+                with timer.phase("summaries"):
+                    texts = {
+                        rec["hash"]: _plain_text(rec["node"])
+                        for rec in changes.values()
+                    }
+
+            with timer.phase("render"):
+                output = generate_rst.render_changelog(self)
+
+            with timer.phase("summaries"):
+                summaries = [
+                    _record_summary(rec, texts.get(rec["hash"]))
+                    for rec in changes.values()
+                ]
+            self.env.note_changelog_records(self.version, summaries)
+            return output
         else:
             return []
 
@@ -87,6 +96,9 @@ class ChangeLogDirective(EnvDirective, Directive):
         self.env.temp_data["ChangeLogDirective"] = self
 
         content = self.content
+        fragment_cache = self.env.fragment_cache
+        notes = []
+        path = None
 
         # 3. read extra per-file included notes
         if "include_notes_from" in parsed:
@@ -106,33 +118,97 @@ class ChangeLogDirective(EnvDirective, Directive):
             if not os.path.exists(path):
                 raise Exception("included nodes path %s does not exist" % path)
 
-            files = [
+            files = sorted(
                 fname for fname in os.listdir(path) if fname.endswith(".rst")
-            ]
-            for fname in self.env.status_iterator(
-                files, "reading changelog note files (version %s)..." % version
-            ):
-                fpath = os.path.join(path, fname)
-                self.env.note_dependency(fpath)
-                with open(fpath) as handle:
-                    content.append("", path, 0)
-                    for num, line in enumerate(handle):
-                        if not py3k:
-                            line = line.decode("utf-8")
-                        if "\t" in line:
-                            warnings.warn(
-                                "file %s has a tab in it! please "
-                                "convert to spaces." % fname
-                            )
-                            line = line.replace("\t", "    ")
-                        line = line.rstrip()
-                        content.append(line, path, num)
-
-        # 4. parse the content of the .. changelog:: directive. This
+            )
+            fpaths = [os.path.join(path, fname) for fname in files]
+            if ChangeLogImportDirective.in_include_directive(self.env):
+                # documents importing this one track these files
+                # through ChangeLogImportDirective
+                ChangeLogImportDirective.note_import_dependencies(
+                    self.env, [path] + fpaths
+                )
+            else:
+                # depend on the directory too, so that adding or removing
+                # a notes file means we're read again
+                self.env.note_directory_dependency(path)
+                for fpath in fpaths:
+                    self.env.note_dependency(fpath)
+
+            # files are read in a thread pool, then consumed here in order
+            with self.env.timer.phase("fragment_io"):
+                for fname, entry in zip(
+                    self.env.status_iterator(
+                        files,
+                        "reading changelog note files (version %s)..."
+                        % version,
+                    ),
+                    fragments.read_fragments(fpaths, fragment_cache),
+                ):
+                    notes.append(entry)
+
+        # 4. add changes from files read by .. changelog_imports:: which
+        # also apply to this version
+        if not ChangeLogImportDirective.in_include_directive(self.env):
+            ChangeLogImportDirective.add_imported_changes(self.env, version)
+
+        # 5. parse the content of the .. changelog:: directive. This
         # is where we parse individual .. change:: directives and construct
         # a list of items, stored in the env via self.get_changes_list(env)
         p = nodes.paragraph("", "")
-        self.state.nested_parse(content[1:], 0, p)
+        with self.env.timer.phase("nested_parse"):
+            self.state.nested_parse(parsed["text"], 0, p)
+
+        # 6. parse the included notes.  these are parsed one file at a
+        # time so that the changes found in each one can be cached along
+        # with the file itself
+        for entry in notes:
+            self._parse_fragment(entry, path, p, fragment_cache)
+
+    def _parse_fragment(self, entry, path, p, fragment_cache):
+        version = self.version
+        context = (self.env.docname, tuple(self.caption_classes))
+        if fragment_cache is not None and entry.digest is not None:
+            changes = fragment_cache.get_changes(entry, context)
+            if changes is not None and ChangeDirective.replay_changes(
+                self.env, version, changes
+            ):
+                return
+        else:
+            fragment_cache = None
+
+        content = StringList(entry.lines, path)
+
+        timer = self.env.timer
+        if fragment_cache is None:
+            with timer.phase("nested_parse"):
+                self.state.nested_parse(content, 0, p)
+            return
+
+        # warnings and errors are reported while parsing, and wouldn't be
+        # again if the changes were replayed; neither would targets,
+        # footnotes and the like be noted on the document.  a file that
+        # has any of these is parsed each time
+        changes = []
+        messages = []
+        reporter = self.state.document.reporter
+        reporter.attach_observer(messages.append)
+        self.env.temp_data["ChangeLogDirective_note_capture"] = changes
+        start = len(p)
+        try:
+            with timer.phase("nested_parse"):
+                self.state.nested_parse(content, 0, p)
+        finally:
+            del self.env.temp_data["ChangeLogDirective_note_capture"]
+            reporter.detach_observer(messages.append)
+        if any(msg["level"] >= reporter.WARNING_LEVEL for msg in messages):
+            return
+        parsed = p.children[start:] + [
+            node for options, node in changes if node is not None
+        ]
+        if any(fragments.registers_with_document(node) for node in parsed):
+            return
+        fragment_cache.set_changes(entry, context, changes)
 
 
 class ChangeLogImportDirective(EnvDirective, Directive):
@@ -150,16 +226,104 @@ class ChangeLogImportDirective(EnvDirective, Directive):
     def in_include_directive(cls, env):
         return "ChangeLogDirective_includes" in env.temp_data
 
+    @classmethod
+    def note_import_dependencies(cls, env, fpaths):
+        imported = env.temp_data.get("ChangeLogDirective_import_capture")
+        if imported is not None and imported.fingerprints is None:
+            imported.dependencies.extend(fpaths)
+
+    @classmethod
+    def add_imported_changes(cls, env, version):
+        """Add those changes brought in by .. changelog_imports:: which
+        apply to the given version."""
+
+        added = env.temp_data.setdefault(
+            "ChangeLogDirective_imported_ids", set()
+        )
+        for imported in env.temp_data.get("ChangeLogDirective_imported", ()):
+            for change in imported.changes_for_version(version):
+                if id(change) in added:
+                    continue
+                added.add(id(change))
+                ChangeDirective.add_change(
+                    env,
+                    change.declared_version,
+                    change.options,
+                    _copy_change_node(env, change.node),
+                )
+
     def run(self):
         # tell ChangeLogDirective we're here, also prevent
         # nested .. include calls
-        if not self.in_include_directive(self.env):
-            self.env.temp_data["ChangeLogDirective_includes"] = True
-            p = nodes.paragraph("", "")
-            self.state.nested_parse(self.content, 0, p)
-            del self.env.temp_data["ChangeLogDirective_includes"]
+        env = self.env
+        if self.in_include_directive(env):
+            return []
+
+        # each included file is parsed only once per build, then its
+        # versioned changes are shared with every other document
+        # importing it
+        import_index = env.import_index
+        imported_list = env.temp_data.setdefault(
+            "ChangeLogDirective_imported", []
+        )
+        env.temp_data["ChangeLogDirective_includes"] = True
+        try:
+            for key, fpath, block in imports.split_import_blocks(self.content):
+                imported = import_index.get(key) if key else None
+                if imported is None:
+                    imported = self._parse_import_block(key, fpath, block)
+                    if key:
+                        import_index.add(key, imported)
+                if fpath:
+                    env.note_included(fpath)
+                if imported.fingerprints is not None:
+                    # we're read again only if changes that apply to our
+                    # versions are modified, see sphinxext.py
+                    env.note_versioned_import(
+                        key, imported.dependencies, imported.fingerprints
+                    )
+                else:
+                    for dependency in imported.dependencies:
+                        if os.path.isdir(dependency):
+                            env.note_directory_dependency(dependency)
+                        else:
+                            env.note_dependency(dependency)
+                imported_list.append(imported)
+        finally:
+            del env.temp_data["ChangeLogDirective_includes"]
         return []
 
+    def _parse_import_block(self, key, fpath, block):
+        env = self.env
+        imported = imports.ImportedChanges()
+
+        # for a plain .. include::, read the file ourselves and give
+        # docutils only the changes that are of interest
+        if key and os.path.exists(fpath):
+            filtered = imports.read_versioned_changes(
+                fpath, key[1], self.state.document.settings.tab_width
+            )
+            if filtered is not None:
+                block = filtered
+                (
+                    imported.dependencies,
+                    imported.fingerprints,
+                ) = imports.versioned_fingerprints(fpath, key[1])
+
+        env.temp_data["ChangeLogDirective_import_capture"] = imported
+        try:
+            p = nodes.paragraph("", "")
+            with env.timer.phase("nested_parse"):
+                self.state.nested_parse(block, 0, p)
+        finally:
+            del env.temp_data["ChangeLogDirective_import_capture"]
+
+        # when .. include:: read the file itself, the entry has to be
+        # dropped from the index once it's modified, as with any other
+        if key and fpath not in imported.dependencies:
+            imported.dependencies.insert(0, fpath)
+        return imported
+
 
 class SeeAlsoDirective(EnvDirective, Directive):
     """implement a quick version of Sphinx "seealso" when running outside
@@ -189,113 +353,246 @@ class ChangeDirective(EnvDirective, Directive):
             return []
 
         content = _parse_content(self.content)
-
-        sorted_tags = _comma_list(content.get("tags", ""))
+        options = {k: v for k, v in content.items() if k != "text"}
         changelog_directive = self.env.temp_data["ChangeLogDirective"]
-        declared_version = changelog_directive.version
-        versions = (
-            set(_comma_list(content.get("versions", "")))
-            .difference([""])
-            .union([declared_version])
-        )
+
+        # if we're parsing an included notes file, hand what we parse
+        # to ChangeLogDirective so that it can be cached
+        capture = self.env.temp_data.get("ChangeLogDirective_note_capture")
 
         # if we don't refer to any other versions and we're in an include,
         # skip
-        if len(
-            versions
-        ) == 1 and ChangeLogImportDirective.in_include_directive(self.env):
-
+        declared_version = changelog_directive.version
+        if self._skip_in_include(self.env, declared_version, options):
+            if capture is not None:
+                capture.append((options, None))
             return []
 
         body_paragraph = nodes.paragraph(
             "", "", classes=changelog_directive.caption_classes
         )
-        self.state.nested_parse(content["text"], 0, body_paragraph)
+        with self.env.timer.phase("nested_parse"):
+            self.state.nested_parse(content["text"], 0, body_paragraph)
 
-        raw_text = _text_rawsource_from_node(body_paragraph)
-        tickets = set(_comma_list(content.get("tickets", ""))).difference([""])
-        pullreq = set(_comma_list(content.get("pullreq", ""))).difference([""])
-        tags = set(sorted_tags).difference([""])
+        if capture is not None:
+            capture.append((options, body_paragraph.deepcopy()))
+
+        self._add_or_capture(
+            self.env, declared_version, options, body_paragraph
+        )
+        return []
+
+    @classmethod
+    def _versions(cls, declared_version, options):
+        return (
+            set(_comma_list(options.get("versions", "")))
+            .difference([""])
+            .union([declared_version])
+        )
+
+    @classmethod
+    def _skip_in_include(cls, env, declared_version, options):
+        return len(
+            cls._versions(declared_version, options)
+        ) == 1 and ChangeLogImportDirective.in_include_directive(env)
+
+    @classmethod
+    def _add_or_capture(cls, env, declared_version, options, body_paragraph):
+        # changes in a file read by .. changelog_imports:: are indexed
+        # by version for ChangeLogDirective to pick up, rather than
+        # being added here
+        imported = env.temp_data.get("ChangeLogDirective_import_capture")
+        if imported is not None:
+            fragments.detach_from_document(body_paragraph)
+            imported.add(
+                declared_version,
+                cls._versions(declared_version, options),
+                options,
+                body_paragraph,
+            )
+        else:
+            cls.add_change(env, declared_version, options, body_paragraph)
 
-        for hash_on_version in versions:
-            issue_hash = _get_robust_version_hash(
-                raw_text, hash_on_version, tickets, tags
+    @classmethod
+    def replay_changes(cls, env, declared_version, changes):
+        """Add changes that were parsed previously, given as a list of
+        ``(options, body_paragraph)`` tuples.
+
+        Returns False without adding anything if a change that's needed
+        was skipped when it was first parsed, in which case the changes
+        need to be parsed again.
+
+        """
+        to_add = [
+            (options, node)
+            for options, node in changes
+            if not cls._skip_in_include(env, declared_version, options)
+        ]
+        if any(node is None for options, node in to_add):
+            return False
+
+        for options, node in to_add:
+            cls._add_or_capture(
+                env, declared_version, options, _copy_change_node(env, node)
             )
+        return True
+
+    @classmethod
+    def add_change(cls, env, declared_version, options, body_paragraph):
+        """Add a change record for each version the change applies towards,
+        or merge into an existing record."""
+
+        sorted_tags = _comma_list(options.get("tags", ""))
+        versions = cls._versions(declared_version, options)
 
-            rec = ChangeLogDirective.get_changes_list(
-                changelog_directive.env, hash_on_version
-            ).setdefault(issue_hash, {})
-            if not rec:
-                sorted(versions, key=_str_version_as_tuple)
-                rec.update(
-                    {
-                        "hash": issue_hash,
-                        "render_for_version": hash_on_version,
-                        "tags": tags,
-                        "tickets": tickets,
-                        "pullreq": pullreq,
-                        "changeset": set(
-                            _comma_list(content.get("changeset", ""))
-                        ).difference([""]),
-                        "node": body_paragraph,
-                        "raw_text": raw_text,
-                        "type": "change",
-                        "title": content.get("title", None),
-                        "sorted_tags": sorted_tags,
-                        "versions": versions,
-                        "version_to_hash": {
-                            version: _get_legacy_version_hash(
-                                raw_text, version
-                            )
-                            for version in versions
-                        },
-                        "source_versions": [declared_version],
-                        "sorted_versions": list(
-                            reversed(
-                                sorted(versions, key=_str_version_as_tuple)
-                            )
+        tickets = set(_comma_list(options.get("tickets", ""))).difference([""])
+        pullreq = set(_comma_list(options.get("pullreq", ""))).difference([""])
+        tags = set(sorted_tags).difference([""])
+
+        changeset = set(_comma_list(options.get("changeset", ""))).difference(
+            [""]
+        )
+
+        with env.timer.phase("hash"):
+            raw_text = _text_rawsource_from_node(body_paragraph)
+            issue_hashes = [
+                (
+                    hash_on_version,
+                    _get_robust_version_hash(
+                        raw_text, hash_on_version, tickets, tags
+                    ),
+                )
+                for hash_on_version in versions
+            ]
+            version_to_hash = {
+                version: _get_legacy_version_hash(raw_text, version)
+                for version in versions
+            }
+
+        # collections shared by the records for each version
+        shared = {}
+        node_users = [0]
+
+        for hash_on_version, issue_hash in issue_hashes:
+            changes = ChangeLogDirective.get_changes_list(env, hash_on_version)
+            rec = changes.get(issue_hash)
+            if rec is None:
+                if not shared:
+                    shared.update(
+                        tags=records.frozen_set(tags),
+                        tickets=records.frozen_set(tickets),
+                        pullreq=records.frozen_set(pullreq),
+                        changeset=records.frozen_set(changeset),
+                        version_to_hash=dict(version_to_hash),
+                        sorted_versions=versionkey.sort_versions(
+                            versions, reverse=True
                         ),
-                    }
+                    )
+                node_users[0] += 1
+                changes[issue_hash] = records.ChangeRecord(
+                    hash=issue_hash,
+                    render_for_version=hash_on_version,
+                    node=body_paragraph,
+                    node_users=node_users,
+                    raw_text=raw_text,
+                    title=options.get("title", None),
+                    sorted_tags=sorted_tags,
+                    versions=versions,
+                    source_versions=[declared_version],
+                    **shared
                 )
             else:
                 # This seems to occur repeated times for each included
                 # changelog, not clear if sphinx has changed the scope
                 # of self.env to lead to this occurring more often
-                self.env.log_debug(
-                    "Merging changelog record '%s' from version(s) %s "
-                    "with that of version %s",
-                    _quick_rec_str(rec),
-                    ", ".join(rec["source_versions"]),
-                    declared_version,
-                )
-                rec["source_versions"].append(declared_version)
-
-                assert rec["raw_text"] == raw_text
-                assert rec["tags"] == tags
-                assert rec["render_for_version"] == hash_on_version
-
-                rec["tickets"].update(tickets)
-                rec["pullreq"].update(pullreq)
-                rec["changeset"].update(
-                    set(_comma_list(content.get("changeset", ""))).difference(
-                        [""]
+                if env.log_debug_enabled:
+                    env.log_debug(
+                        "Merging changelog record '%s' from version(s) %s "
+                        "with that of version %s",
+                        _quick_rec_str(rec),
+                        ", ".join(rec.source_versions),
+                        declared_version,
                     )
+                rec.source_versions.append(declared_version)
+
+                assert rec.raw_text == raw_text
+                assert rec.tags == tags
+                assert rec.render_for_version == hash_on_version
+
+                if rec.node.parent is not None:
+                    # already rendered, and its node given to the document;
+                    # it will be rendered again from this one
+                    node_users[0] += 1
+                    rec.node = body_paragraph
+                    rec.node_users = node_users
+
+                rec.tickets = records.frozen_set(rec.tickets.union(tickets))
+                rec.pullreq = records.frozen_set(rec.pullreq.union(pullreq))
+                rec.changeset = records.frozen_set(
+                    rec.changeset.union(changeset)
                 )
-                rec["versions"].update(versions)
+                rec.versions.update(versions)
 
-                rec["version_to_hash"].update(
-                    {
-                        version: _get_legacy_version_hash(raw_text, version)
-                        for version in versions
-                    }
-                )
-                rec["sorted_versions"] = list(
-                    reversed(
-                        sorted(rec["versions"], key=_str_version_as_tuple)
-                    )
+                rec.version_to_hash.update(version_to_hash)
+                rec.sorted_versions = versionkey.sort_versions(
+                    rec.versions, reverse=True
                 )
 
-        return []
+
+def _copy_change_node(env, node):
+    """Copy a change body parsed earlier, possibly from another document,
+    for use in the current one."""
+
+    node = node.deepcopy()
+    env.adopt_node(node)
+    return node
+
+
+def _record_summary(rec, text=None):
+    """Return the parts of a rendered change record that are kept after
+    the document is read, along with the plain text of the change if
+    given."""
+
+    summary = {
+        "hash": rec["hash"],
+        "id": rec["id"],
+        "render_for_version": rec["render_for_version"],
+        "versions": list(rec["sorted_versions"]),
+        "version_to_hash": dict(rec["version_to_hash"]),
+        "tags": sorted(rec["tags"]),
+        "tickets": sorted(rec["tickets"]),
+        "pullreq": sorted(rec["pullreq"]),
+        "changeset": sorted(rec["changeset"]),
+        "title": rec["title"],
+    }
+    if text is not None:
+        summary["text"] = text
+    return summary
+
+
+def _plain_text(node):
+    """Return the text of a node much as ``astext()`` does, leaving out
+    any system messages within it.
+
+    Change bodies are parsed into a paragraph, whose children would
+    otherwise be run together without a separator.
+
+    """
+
+    if isinstance(node, nodes.system_message):
+        return ""
+    elif isinstance(node, nodes.Text):
+        return node.astext()
+
+    if any(isinstance(child, nodes.Body) for child in node.children):
+        separator = "\n\n"
+    else:
+        separator = node.child_text_separator
+    return separator.join(
+        text
+        for text in (_plain_text(child) for child in node.children)
+        if text
+    )
 
 
 def _quick_rec_str(rec):
@@ -317,10 +614,13 @@ def _get_legacy_version_hash(raw_text, version):
 def _get_robust_version_hash(raw_text, version, tickets, tags):
     # this needs to stay like this for link compatibility
     # with thousands of already-published changelogs
+    # tickets and tags are sorted, as set order varies from one process
+    # to the next; this doesn't change the hash of a change with one tag
+    # and up to one ticket
     to_hash = "%s %s %s %s" % (
         version,
-        ", ".join(tickets),
-        ", ".join(tags),
+        ", ".join(sorted(tickets)),
+        ", ".join(sorted(tags)),
         raw_text,
     )
     return md5.md5(to_hash.encode("ascii", "ignore")).hexdigest()
@@ -337,18 +637,6 @@ def _text_rawsource_from_node(node):
     return "".join(src)
 
 
-_VERSION_IDS = {}
-
-
-def _str_version_as_tuple(ver):
-    if ver in _VERSION_IDS:
-        return _VERSION_IDS[ver]
-
-    result = LooseVersion(ver)
-    _VERSION_IDS[ver] = result
-    return result
-
-
 def make_ticket_link(
     name, rawtext, text, lineno, inliner, options={}, content=[]
 ):
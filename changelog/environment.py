@@ -1,6 +1,12 @@
 import logging
+import os
 import sys
 
+from . import config
+from . import fragments
+from . import imports
+from . import timing
+
 LOG = logging.getLogger(__name__)
 
 
@@ -54,9 +60,52 @@ class Environment(object):
     def changelog_render_changeset(self):
         raise NotImplementedError()
 
+    @property
+    def docname(self):
+        raise NotImplementedError()
+
+    @property
+    def fragment_cache(self):
+        raise NotImplementedError()
+
+    @property
+    def import_index(self):
+        raise NotImplementedError()
+
+    @property
+    def timer(self):
+        raise NotImplementedError()
+
+    @property
+    def log_debug_enabled(self):
+        raise NotImplementedError()
+
+    def adopt_node(self, node):
+        raise NotImplementedError()
+
+    @property
+    def changelog_records(self):
+        raise NotImplementedError()
+
+    @property
+    def changelog_record_text(self):
+        raise NotImplementedError()
+
+    def note_changelog_records(self, version, records):
+        raise NotImplementedError()
+
     def note_dependency(self, fpath):
         raise NotImplementedError()
 
+    def note_directory_dependency(self, path):
+        raise NotImplementedError()
+
+    def note_included(self, fpath):
+        raise NotImplementedError()
+
+    def note_versioned_import(self, key, dependencies, fingerprints):
+        raise NotImplementedError()
+
     def status_iterator(self, elements, message):
         raise NotImplementedError()
 
@@ -66,11 +115,41 @@ class DefaultEnvironment(Environment):
     def from_document_settings(cls, settings):
         return settings.changelog_env
 
-    def __init__(self, config_filename=None):
+    def __init__(self, config_filename=None, record_text=False):
         self._temp_data = {}
-        self.config = {}
+        self._record_text = record_text
+        self._import_index = imports.ImportIndex()
+        self._changelog_records = {}
         if config_filename is not None:
-            exec(open(config_filename).read(), self.config)
+            self.config = config.read_config(config_filename)
+        else:
+            self.config = {}
+
+        cache_setting = self.config.get("changelog_fragment_cache", None)
+        if cache_setting:
+            if cache_setting is True:
+                cache_setting = os.path.join(
+                    os.environ.get(
+                        "XDG_CACHE_HOME", os.path.expanduser("~/.cache")
+                    ),
+                    "changelog",
+                    "fragments.pickle",
+                )
+            # the cache may be shared between projects; the changes parsed
+            # from each file are kept per configuration
+            self._fragment_cache = fragments.FragmentCache(
+                cache_setting,
+                self.config.get("changelog_fragment_cache_size", 5000),
+                fragments.settings_signature(
+                    (name, value)
+                    for name, value in self.config.items()
+                    if name.startswith("changelog_")
+                ),
+            )
+        else:
+            # still worth it within a single run, as imported changelog
+            # files will read the same notes directories again
+            self._fragment_cache = fragments.FragmentCache()
 
     def log_debug(self, msg, *args):
         LOG.debug(msg, *args)
@@ -111,9 +190,58 @@ class DefaultEnvironment(Environment):
     def changelog_render_changeset(self):
         return self.config.get("changelog_render_changeset", "changeset:%s")
 
+    @property
+    def docname(self):
+        return None
+
+    @property
+    def fragment_cache(self):
+        return self._fragment_cache
+
+    @property
+    def import_index(self):
+        return self._import_index
+
+    @property
+    def timer(self):
+        return timing.NULL
+
+    @property
+    def log_debug_enabled(self):
+        return LOG.isEnabledFor(logging.DEBUG)
+
+    def adopt_node(self, node):
+        pass
+
+    @property
+    def changelog_records(self):
+        return self._changelog_records
+
+    @property
+    def changelog_record_text(self):
+        return self._record_text
+
+    def note_changelog_records(self, version, records):
+        self._changelog_records[version] = records
+
+    def close(self):
+        """Save the fragment cache and log its statistics."""
+
+        self._fragment_cache.save()
+        LOG.debug(self._fragment_cache.report())
+
     def note_dependency(self, fpath):
         pass
 
+    def note_directory_dependency(self, path):
+        pass
+
+    def note_included(self, fpath):
+        pass
+
+    def note_versioned_import(self, key, dependencies, fingerprints):
+        pass
+
     def status_iterator(self, elements, message):
         for i, element in enumerate(elements, 1):
             percent = (i / len(elements)) * 100
@@ -0,0 +1,329 @@
+"""Read and cache the per-change ``.rst`` files referred to by
+``:include_notes_from:``.
+
+"""
+import collections
+from concurrent import futures
+import hashlib
+import io
+import itertools
+import logging
+import os
+import pickle
+import threading
+import warnings
+
+import docutils
+from docutils import nodes
+
+from . import __version__
+
+LOG = logging.getLogger(__name__)
+
+# bump when the layout of what's pickled changes
+_CACHE_FORMAT = 2
+
+_COUNTS = ("hits", "misses", "parse_hits", "parse_misses")
+
+
+class FragmentEntry(object):
+    """The normalized contents of a single fragment file, plus the
+    change options / body nodes parsed from it, per parse context."""
+
+    __slots__ = ("digest", "lines", "has_tabs", "changes")
+
+    def __init__(self, digest, lines, has_tabs):
+        self.digest = digest
+        self.lines = lines
+        self.has_tabs = has_tabs
+        self.changes = {}
+
+
+class FragmentCache(object):
+    """A content-addressed cache of fragment files.
+
+    Entries are keyed on the SHA1 digest of the file contents; a secondary
+    index of ``path -> (size, mtime, digest)`` allows an unchanged file to
+    be served without reading it at all.   A file whose stat has changed is
+    read and hashed, and is still a hit if its contents are the same.
+
+    When ``filename`` is given, the cache is loaded from / saved to that
+    file using pickle; otherwise it lives only for the current process.
+    At most ``max_size`` entries are kept, least recently used first out.
+
+    The changes parsed from an entry are kept per parse context along
+    with ``signature``, as returned by :func:`.settings_signature`, so
+    that those parsed with other settings or versions aren't used.
+
+    """
+
+    def __init__(self, filename=None, max_size=5000, signature=None):
+        self.filename = filename
+        self.max_size = max_size
+        self.signature = signature
+        self.hits = self.misses = 0
+        self.parse_hits = self.parse_misses = 0
+        self._entries = collections.OrderedDict()
+        self._stats = {}
+        self._new = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if filename is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, "rb") as handle:
+                fmt, docutils_version, entries, stats = pickle.load(handle)
+        except FileNotFoundError:
+            return
+        except Exception as err:
+            LOG.debug(
+                "discarding unreadable changelog fragment cache %s: %s",
+                self.filename,
+                err,
+            )
+            return
+        if (fmt, docutils_version) == (_CACHE_FORMAT, docutils.__version__):
+            self._entries = entries
+            self._stats = stats
+
+    def save(self):
+        """Write the cache to its file, if it has one and has changed."""
+
+        if self.filename is None or not self._dirty:
+            return
+        stats = {
+            path: stat
+            for path, stat in self._stats.items()
+            if stat[2] in self._entries
+        }
+        dirname = os.path.dirname(self.filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmp = "%s.%d.tmp" % (self.filename, os.getpid())
+        with open(tmp, "wb") as handle:
+            pickle.dump(
+                (_CACHE_FORMAT, docutils.__version__, self._entries, stats),
+                handle,
+                pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, self.filename)
+        self._dirty = False
+
+    def read(self, fpath):
+        """Return the :class:`.FragmentEntry` for the given file.
+
+        This method may be called from multiple threads at once.
+
+        """
+
+        st = os.stat(fpath)
+        with self._lock:
+            stat = self._stats.get(fpath)
+            if (
+                stat is not None
+                and stat[0:2] == (st.st_size, st.st_mtime_ns)
+                and stat[2] in self._entries
+            ):
+                self.hits += 1
+                entry = self._entries[stat[2]]
+                self._entries.move_to_end(entry.digest)
+                return entry
+
+        with open(fpath, "rb") as handle:
+            data = handle.read()
+        digest = hashlib.sha1(data).hexdigest()
+
+        with self._lock:
+            self._stats[fpath] = (st.st_size, st.st_mtime_ns, digest)
+            self._dirty = True
+
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(digest)
+                return entry
+
+        entry = _normalize(digest, data)
+
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.setdefault(digest, entry)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear_changes(self):
+        """Forget the changes parsed from every entry, keeping only the
+        contents of the files."""
+
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.changes:
+                    entry.changes = {}
+                    self._dirty = True
+
+    def get_changes(self, entry, context):
+        """Return the list of ``(options, node)`` tuples previously stored
+        for the given entry and parse context, or None."""
+
+        changes = entry.changes.get((self.signature, context))
+        if changes is None:
+            self.parse_misses += 1
+        else:
+            self.parse_hits += 1
+        return changes
+
+    def set_changes(self, entry, context, changes):
+        for options, node in changes:
+            if node is not None:
+                detach_from_document(node)
+        entry.changes[(self.signature, context)] = changes
+        self._new[entry.digest] = entry
+        self._dirty = True
+
+    def take_new(self):
+        """Return the entries for which changes have been stored since
+        the last call, for :meth:`.merge` into another cache."""
+
+        new = list(self._new.values())
+        self._new.clear()
+        return new
+
+    def merge(self, entries):
+        """Add entries taken from another cache with :meth:`.take_new`,
+        along with the changes parsed from them."""
+
+        with self._lock:
+            for entry in entries:
+                existing = self._entries.get(entry.digest)
+                if existing is None:
+                    self._entries[entry.digest] = entry
+                else:
+                    existing.changes.update(entry.changes)
+                    self._entries.move_to_end(entry.digest)
+                self._dirty = True
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def take_counts(self):
+        """Return the hit and miss counts as a dictionary, resetting them,
+        for :meth:`.add_counts` to another cache."""
+
+        with self._lock:
+            counts = {name: getattr(self, name) for name in _COUNTS}
+            for name in _COUNTS:
+                setattr(self, name, 0)
+        return counts
+
+    def add_counts(self, counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def report(self):
+        return (
+            "changelog fragment cache: %d hits, %d misses reading; "
+            "%d hits, %d misses parsing"
+            % (self.hits, self.misses, self.parse_hits, self.parse_misses)
+        )
+
+
+def settings_signature(settings, *versions):
+    """Return a digest of the given ``(name, value)`` settings, along with
+    the given version strings and that of changelog itself."""
+
+    settings = sorted((name, repr(value)) for name, value in settings)
+    data = repr((__version__, versions, settings))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def _normalize(digest, data):
+    lines = []
+    has_tabs = False
+    for line in io.StringIO(data.decode("utf-8"), newline=None):
+        if "\t" in line:
+            has_tabs = True
+            line = line.replace("\t", "    ")
+        lines.append(line.rstrip())
+    return FragmentEntry(digest, lines, has_tabs)
+
+
+def detach_from_document(node):
+    """Remove the reference each node holds to the document it was parsed
+    in, so that the nodes may be pickled or moved to another document
+    without bringing the whole document along."""
+
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        n.document = None
+        stack.extend(n.children)
+
+
+# nodes which docutils notes on the document as they're parsed, for its
+# transforms to resolve later; replaying a copy of them wouldn't
+_DOCUMENT_NODES = (
+    nodes.target,
+    nodes.footnote,
+    nodes.footnote_reference,
+    nodes.citation,
+    nodes.citation_reference,
+    nodes.substitution_definition,
+    nodes.substitution_reference,
+)
+
+_DOCUMENT_ATTRIBUTES = ("ids", "names", "refname", "anonymous")
+
+
+def registers_with_document(node):
+    """Return True if the node, or any node within it, is one that's noted
+    on the document while parsing, such as a target or footnote, or is
+    named or referred to by name."""
+
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, _DOCUMENT_NODES) or (
+            isinstance(n, nodes.Element)
+            and any(n.get(attr) for attr in _DOCUMENT_ATTRIBUTES)
+        ):
+            return True
+        stack.extend(n.children)
+    return False
+
+
+def _read_fragment(fpath, cache):
+    if cache is not None:
+        return cache.read(fpath)
+    with open(fpath, "rb") as handle:
+        data = handle.read()
+    return _normalize(None, data)
+
+
+def read_fragments(fpaths, cache=None, max_workers=None):
+    """Read the given fragment files using a pool of threads, yielding a
+    :class:`.FragmentEntry` for each one in the order given.
+
+    Uses the given :class:`.FragmentCache` if any.
+
+    """
+    if len(fpaths) < 2:
+        loaded = (_read_fragment(fpath, cache) for fpath in fpaths)
+        executor = None
+    else:
+        executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        loaded = executor.map(_read_fragment, fpaths, itertools.repeat(cache))
+
+    try:
+        for fpath, entry in zip(fpaths, loaded):
+            if entry.has_tabs:
+                warnings.warn(
+                    "file %s has a tab in it! please "
+                    "convert to spaces." % os.path.basename(fpath)
+                )
+            yield entry
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -1,5 +1,6 @@
 #! coding: utf-8
 import collections
+import functools
 import itertools
 
 from docutils import nodes
@@ -15,9 +16,10 @@ def render_changelog(changelog_directive):
     topsection = _run_top(changelog_directive, id_prefix)
     output.append(topsection)
 
-    bysection, all_sections = _organize_by_section(
-        changelog_directive, changes
-    )
+    with changelog_directive.env.timer.phase("organize_by_section"):
+        bysection, all_sections = _organize_by_section(
+            changelog_directive, changes
+        )
 
     counter = itertools.count()
 
@@ -62,43 +64,96 @@ def render_changelog(changelog_directive):
 
 
 def _organize_by_section(changelog_directive, changes):
-    compound_sections = [
-        (s, s.split(" ")) for s in changelog_directive.sections if " " in s
-    ]
+    table = SectionTable.for_config(
+        tuple(changelog_directive.sections),
+        tuple(changelog_directive.inner_tag_sort),
+    )
 
     bysection = collections.defaultdict(list)
     all_sections = set()
     for rec in changes:
         assert changelog_directive.version == rec["render_for_version"]
 
-        inner_tag = rec["tags"].intersection(
-            changelog_directive.inner_tag_sort
-        )
-        if inner_tag:
-            inner_tag = inner_tag.pop()
+        section, inner_tag = table.classify(rec["tags"], rec["sorted_tags"])
+        if section is None:
+            section = changelog_directive.default_section
         else:
-            inner_tag = ""
-
-        for compound, comp_words in compound_sections:
-            if rec["tags"].issuperset(comp_words):
-                bysection[(compound, inner_tag)].append(rec)
-                all_sections.add(compound)
-                break
-        else:
-            intersect = rec["tags"].intersection(changelog_directive.sections)
-            if intersect:
-                for sec in rec["sorted_tags"]:
-                    if sec in intersect:
-                        bysection[(sec, inner_tag)].append(rec)
-                        all_sections.add(sec)
-                        break
-            else:
-                bysection[
-                    (changelog_directive.default_section, inner_tag)
-                ].append(rec)
+            all_sections.add(section)
+        bysection[(section, inner_tag)].append(rec)
     return bysection, all_sections
 
 
+class SectionTable(object):
+    """The ``changelog_sections`` and ``changelog_inner_tag_sort``
+    configuration, compiled into bitmasks.
+
+    Each tag named by the configuration gets a bit; inner sort tags are
+    assigned the lowest bits in their sort order, so that the lowest bit
+    set in a record's mask tells its inner tag directly.
+
+    """
+
+    __slots__ = (
+        "tag_bits",
+        "inner_mask",
+        "inner_tags",
+        "compound_sections",
+        "simple_sections",
+    )
+
+    def __init__(self, sections, inner_tag_sort):
+        self.tag_bits = tag_bits = {}
+
+        def bit(tag):
+            if tag not in tag_bits:
+                tag_bits[tag] = 1 << len(tag_bits)
+            return tag_bits[tag]
+
+        self.inner_tags = {}
+        self.inner_mask = 0
+        for tag in inner_tag_sort:
+            if tag and tag not in tag_bits:
+                self.inner_tags[bit(tag)] = tag
+                self.inner_mask |= tag_bits[tag]
+
+        # a compound section is also matched by a single tag of the same
+        # name, e.g. ":tags: orm declarative, bug"
+        self.compound_sections = []
+        self.simple_sections = set(sections)
+        for section in sections:
+            if " " in section:
+                mask = 0
+                for word in section.split(" "):
+                    mask |= bit(word)
+                self.compound_sections.append((section, mask))
+
+    @classmethod
+    @functools.lru_cache(maxsize=32)
+    def for_config(cls, sections, inner_tag_sort):
+        return cls(sections, inner_tag_sort)
+
+    def classify(self, tags, sorted_tags):
+        """Return ``(section, inner_tag)`` for a record with the given
+        tags; ``section`` is None for the default section."""
+
+        tag_bits = self.tag_bits
+        mask = 0
+        for tag in tags:
+            mask |= tag_bits.get(tag, 0)
+
+        inner = mask & self.inner_mask
+        inner_tag = self.inner_tags[inner & -inner] if inner else ""
+
+        for section, section_mask in self.compound_sections:
+            if mask & section_mask == section_mask:
+                return section, inner_tag
+
+        for tag in sorted_tags:
+            if tag in self.simple_sections:
+                return tag, inner_tag
+        return None, inner_tag
+
+
 def _append_node(changelog_directive):
     return nodes.bullet_list()
 
@@ -131,16 +186,19 @@ def _run_top(changelog_directive, id_prefix):
     # if encountered any text elements that didn't start with
     # ".. change::", those become the intro
     if len_ > 0:
-        changelog_directive.state.nested_parse(
-            changelog_directive._parsed_content["text"][0:len_], 0, intro_para
-        )
+        with changelog_directive.env.timer.phase("nested_parse"):
+            changelog_directive.state.nested_parse(
+                changelog_directive._parsed_content["text"][0:len_],
+                0,
+                intro_para,
+            )
         topsection.append(intro_para)
 
     return topsection
 
 
 def _render_rec(changelog_directive, rec, section, cat, append_sec):
-    para = rec["node"].deepcopy()
+    para = rec.take_node()
 
     targetid = "change-%s" % (
         rec["version_to_hash"][changelog_directive.version],
@@ -0,0 +1,298 @@
+"""Index of the changes brought in by ``.. changelog_imports::``.
+
+Only changes which name additional versions using ``:versions:`` are of
+interest to an importing changelog, so each imported file is parsed once,
+the versioned changes it contains are stored here, and each document then
+looks up those which apply to the versions it renders.   Under Sphinx the
+index lives on the build environment, so it's kept between builds and
+merged back from parallel read processes; an entry is used only as long
+as none of the files it was parsed from have changed.
+
+"""
+import collections
+import hashlib
+import os
+import re
+
+from docutils import statemachine
+from docutils.statemachine import StringList
+
+from . import scanner
+
+_INCLUDE = re.compile(r"^\.\. +include:: *(\S.*?)\s*$")
+
+# .. include:: options which read_versioned_changes() knows how to apply
+_CLIP_OPTIONS = {"start-line", "end-line"}
+
+
+class ImportedChange(object):
+    """A change with more than one version, found in an imported file."""
+
+    __slots__ = ("declared_version", "versions", "options", "node")
+
+    def __init__(self, declared_version, versions, options, node):
+        self.declared_version = declared_version
+        self.versions = versions
+        self.options = options
+        self.node = node
+
+
+class ImportedChanges(object):
+    """The versioned changes found in one block of a
+    ``.. changelog_imports::`` directive, typically one ``.. include::``,
+    indexed by each version they apply towards."""
+
+    __slots__ = ("dependencies", "by_version", "signature", "fingerprints")
+
+    def __init__(self):
+        self.dependencies = []
+        self.by_version = collections.defaultdict(list)
+        self.signature = None
+
+        # set up by versioned_fingerprints() when the file was read
+        # without going through the .. include:: directive
+        self.fingerprints = None
+
+    def finish(self):
+        """Record the state of the files parsed, once parsing is done."""
+
+        self.signature = signature(self.dependencies)
+
+    def is_current(self):
+        return self.signature == signature(self.dependencies)
+
+    def add(self, declared_version, versions, options, node):
+        change = ImportedChange(declared_version, versions, options, node)
+        for version in versions:
+            self.by_version[version].append(change)
+
+    def changes_for_version(self, version):
+        return self.by_version.get(version, ())
+
+
+class ImportIndex(object):
+    """Build-wide collection of :class:`.ImportedChanges`, keyed on the
+    included file and the options given to ``.. include::``."""
+
+    def __init__(self):
+        self._imports = {}
+
+    def get(self, key):
+        imported = self._imports.get(key)
+        if imported is not None and not imported.is_current():
+            del self._imports[key]
+            return None
+        return imported
+
+    def add(self, key, imported):
+        imported.finish()
+        self._imports[key] = imported
+
+    def merge(self, other):
+        """Merge entries from the index of another process."""
+
+        self._imports.update(other._imports)
+
+    def __len__(self):
+        return len(self._imports)
+
+
+def signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def split_import_blocks(content):
+    """Split the content of a ``.. changelog_imports::`` directive into
+    blocks, returning a list of ``(key, path, block)`` for each.
+
+    Each ``.. include::`` of a relative path, along with its options, is
+    a block with a key suitable for :class:`.ImportIndex`, and the path
+    of the file it includes.  Any other content is given a key and
+    path of None.
+
+    The list is complete before any block is parsed, which matters as
+    parsing an ``.. include::`` inserts the included lines into the
+    content.
+
+    """
+    blocks = []
+    start = 0
+    idx = 0
+    while idx < len(content):
+        m = _INCLUDE.match(content[idx])
+        if not m:
+            idx += 1
+            continue
+
+        if idx > start:
+            blocks.append((None, None, content[start:idx]))
+
+        end = idx + 1
+        while end < len(content) and (
+            not content[end] or content[end][0].isspace()
+        ):
+            end += 1
+
+        block = content[idx:end]
+        filename = m.group(1)
+        if filename.startswith(("/", "<")):
+            blocks.append((None, None, block))
+        else:
+            source = content.items[idx][0].split(" ")[0]
+            path = os.path.normpath(
+                os.path.join(
+                    os.path.dirname(os.path.abspath(source)), filename
+                )
+            )
+            options = tuple(
+                line.strip() for line in content[idx + 1 : end] if line
+            )
+            blocks.append(((path, options), path, block))
+        start = idx = end
+
+    if start < len(content):
+        blocks.append((None, None, content[start:]))
+    return blocks
+
+
+def _parse_clip_options(include_options):
+    clip = {}
+    for line in include_options:
+        option = scanner.parse_option(line)
+        if option is None or option[0] not in _CLIP_OPTIONS:
+            return None
+        try:
+            clip[option[0]] = int(option[1])
+        except ValueError:
+            # left to the include directive to report
+            return None
+    return clip
+
+
+def _read_clipped(path, clip, tab_width):
+    with open(path, encoding="utf-8-sig") as handle:
+        text = handle.read()
+    if clip:
+        text = "\n".join(
+            text.splitlines()[clip.get("start-line", 0) : clip.get("end-line")]
+        )
+    return statemachine.string2lines(text, tab_width, convert_whitespace=True)
+
+
+def read_versioned_changes(path, include_options, tab_width=8):
+    """Read a file named by ``.. include::`` within ``.. changelog_imports::``,
+    returning only those parts of it which are of interest to an
+    importing changelog.
+
+    This is the ``.. changelog::`` directives along with their options,
+    and within them the ``.. change::`` directives that have a
+    ``:versions:`` option; all other changes apply only to the version
+    they're declared in, so the importing changelog would skip them
+    after docutils had gone to the trouble of parsing them.
+
+    ``include_options`` are the option lines given to ``.. include::``;
+    if any of them aren't supported here, None is returned and the
+    include should be parsed normally.
+
+    """
+    clip = _parse_clip_options(include_options)
+    if clip is None:
+        return None
+    lines = _read_clipped(path, clip, tab_width)
+    start = clip.get("start-line", 0)
+
+    content = StringList()
+    lineno = 0
+    for idx in versioned_change_lines(lines):
+        if idx is not None:
+            lineno = idx
+            content.append(lines[idx], path, start + lineno)
+        else:
+            content.append("", path, start + lineno)
+    return content
+
+
+def versioned_change_lines(lines):
+    """Given the lines of a changelog file, return the indexes of the
+    lines to be kept by :func:`.read_versioned_changes`, with None for
+    blank lines that need to be inserted."""
+
+    keep = []
+    for kind, start, end, options in _scan(lines):
+        keep.extend(range(start, end))
+        keep.append(None)
+    return keep
+
+
+def versioned_fingerprints(path, include_options):
+    """Return ``(dependencies, fingerprints)`` for a file named by
+    ``.. include::`` within ``.. changelog_imports::``, without using
+    docutils.
+
+    ``fingerprints`` is a dictionary of version to a digest of the text of
+    every versioned change which applies to that version, including those
+    in ``:include_notes_from:`` directories; when the digest for a version
+    is unchanged, a changelog rendering that version doesn't need to
+    be read again.  ``dependencies`` are the files and directories read.
+
+    Returns None if the include options aren't supported.
+
+    """
+    clip = _parse_clip_options(include_options)
+    if clip is None:
+        return None
+    dependencies = [path]
+    digests = collections.defaultdict(hashlib.sha1)
+
+    def add(lines, start, end, options, declared_version):
+        block = "\n".join(lines[start:end]).encode("utf-8")
+        for version in scanner.comma_set(options["versions"]).union(
+            [declared_version]
+        ):
+            digests[version].update(declared_version.encode("utf-8"))
+            digests[version].update(block)
+
+    lines = _read_clipped(path, clip, 8)
+    declared_version = ""
+    for kind, start, end, options in _scan(lines):
+        if kind == "change":
+            add(lines, start, end, options, declared_version)
+            continue
+
+        declared_version = options.get("version", "")
+        notes_from = options.get("include_notes_from")
+        if not notes_from:
+            continue
+        notes_dir = os.path.join(os.path.dirname(path), notes_from)
+        if not os.path.isdir(notes_dir):
+            continue
+        dependencies.append(notes_dir)
+        for fname in sorted(os.listdir(notes_dir)):
+            if not fname.endswith(".rst"):
+                continue
+            fpath = os.path.join(notes_dir, fname)
+            dependencies.append(fpath)
+            note_lines = _read_clipped(fpath, None, 8)
+            for kind, start, end, options in _scan(note_lines):
+                if kind == "change":
+                    add(note_lines, start, end, options, declared_version)
+
+    return dependencies, {
+        version: digest.hexdigest() for version, digest in digests.items()
+    }
+
+
+def _scan(lines):
+    """Yield ``(kind, start, end, options)`` for each ``.. changelog::``
+    directive header plus its options, and each ``.. change::`` directive
+    that has a ``:versions:`` option."""
+
+    for kind, start, end, options in scanner.scan_lines(lines):
+        if kind == "changelog" or "versions" in options:
+            yield kind, start, end, options
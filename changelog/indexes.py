@@ -0,0 +1,104 @@
+"""Static lookup tables built from the change records of every changelog
+document, written alongside the HTML output so that a page can find a
+change with one small fetch rather than by crawling the changelogs.
+
+"""
+from . import versionkey
+
+
+def permalink_id(record):
+    """Return the id of the permalink anchor of a change record summary,
+    as rendered by :func:`.generate_rst._render_rec`."""
+
+    return "change-%s" % (
+        record["version_to_hash"][record["render_for_version"]],
+    )
+
+
+def ticket_index(records_by_doc, get_uri):
+    """Return a dictionary of the changes rendered for each ticket and
+    pull request.
+
+    ``records_by_doc`` is ``{docname: {version: [record summary, ...]}}``
+    as kept by the Sphinx extension, and ``get_uri`` returns the URI of a
+    document's page relative to the root of the output.
+
+    The result looks like::
+
+        {
+            "fields": ["version", "uri", "tags"],
+            "tickets": {
+                "6200": [
+                    ["1.4.0", "changelog/changelog_14.html#change-...",
+                     ["bug", "orm"]],
+                    ...
+                ],
+            },
+            "pullreq": {...}
+        }
+
+    with each ticket's or pull request's changes listed newest version
+    first, one for each version a change is rendered in.
+
+    """
+
+    index = {"tickets": {}, "pullreq": {}}
+    for docname in sorted(records_by_doc):
+        uri = get_uri(docname)
+        for version, records in records_by_doc[docname].items():
+            for record in records:
+                entry = [
+                    version,
+                    "%s#%s" % (uri, permalink_id(record)),
+                    record["tags"],
+                ]
+                for key in ("tickets", "pullreq"):
+                    for name in record[key]:
+                        index[key].setdefault(name, []).append(entry)
+
+    for entries in list(index["tickets"].values()) + list(
+        index["pullreq"].values()
+    ):
+        entries.sort(
+            key=lambda entry: versionkey.version_key(entry[0]), reverse=True
+        )
+
+    index["fields"] = ["version", "uri", "tags"]
+    return index
+
+
+def anchor_map(records_by_doc, get_uri):
+    """Return a dictionary of every ``change-<hash>`` anchor a change has
+    had, to the ``uri#id`` of its permalink where it's rendered now.
+
+    ``records_by_doc`` and ``get_uri`` are as for :func:`.ticket_index`.
+
+    The anchors are those of the legacy hash of a change's text with each
+    of its versions, which is its permalink for that version, and of its
+    robust hash, which also takes in its tickets and tags.   As the
+    anchors don't depend on the page, this also finds a change whose
+    link is to the page of a version it was moved away from with
+    ``:versions:``; each anchor goes to the page the change is rendered
+    on for that anchor's version, or if that version isn't rendered at
+    all, to another of the change's pages.
+
+    """
+
+    anchors = {}
+    targets = []
+    for docname in sorted(records_by_doc):
+        uri = get_uri(docname)
+        for version, records in records_by_doc[docname].items():
+            for record in records:
+                anchor = permalink_id(record)
+                target = "%s#%s" % (uri, anchor)
+                anchors.setdefault(anchor, target)
+                anchors.setdefault("change-%s" % record["hash"], target)
+                targets.append((record, target))
+
+    # the hashes of versions that aren't rendered in any document
+    for record, target in targets:
+        for legacy_hash in record["version_to_hash"].values():
+            anchors.setdefault("change-%s" % legacy_hash, target)
+
+    return anchors
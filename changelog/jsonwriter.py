@@ -0,0 +1,73 @@
+"""Export the change records of a changelog file as newline-delimited
+JSON."""
+import json
+import sys
+
+from docutils.core import publish_doctree
+
+from . import scanner
+from .docutils import setup_docutils
+from .environment import DefaultEnvironment
+from .environment import Environment
+
+
+def iter_change_records(
+    target_filename, config_filename, since=None, until=None
+):
+    """Yield a dictionary for each change in the given file, as recorded
+    when it's rendered, one version at a time.
+
+    Keys are ``hash``, ``id``, ``render_for_version``, ``versions``,
+    ``version_to_hash``, ``tags``, ``tickets``, ``pullreq``,
+    ``changeset``, ``title`` and ``text``, the last being the change's
+    plain text.   A change that applies to more than one version is
+    yielded for each of them.
+
+    Each version is parsed only as its records are asked for, so memory
+    use doesn't depend on the size of the file.   ``since`` and / or
+    ``until`` limit the versions to a range, as for
+    :func:`.scanner.versions_in_range`.
+
+    """
+    Environment.register(DefaultEnvironment)
+
+    setup_docutils()
+    env = DefaultEnvironment(config_filename, record_text=True)
+    index = scanner.VersionIndex(target_filename)
+
+    try:
+        for version in index.versions_in_range(since, until):
+            env.temp_data.clear()
+            env.changelog_records.clear()
+            publish_doctree(
+                index.excerpt({version}),
+                source_path=target_filename,
+                settings_overrides={
+                    "changelog_env": env,
+                    "report_level": 3,
+                    # see VersionIndex.excerpt()
+                    "doctitle_xform": False,
+                },
+            )
+            for record in env.changelog_records.get(version, ()):
+                yield record
+    finally:
+        env.close()
+
+
+def write_change_records(
+    target_filename, config_filename, output, since=None, until=None
+):
+    """Write the records from :func:`.iter_change_records` to the given
+    text stream, one JSON object per line."""
+
+    for record in iter_change_records(
+        target_filename, config_filename, since=since, until=until
+    ):
+        output.write(json.dumps(record) + "\n")
+
+
+def render_changelog_as_json(target_filename, config_filename, since, until):
+    write_change_records(
+        target_filename, config_filename, sys.stdout, since=since, until=until
+    )
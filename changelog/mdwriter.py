@@ -1,10 +1,14 @@
+from concurrent import futures
 import io
+import os
+import sys
 
 from docutils import nodes
 from docutils import writers
 from docutils.core import publish_file
 from docutils.core import publish_string
 
+from . import scanner
 from .docutils import setup_docutils
 from .environment import DefaultEnvironment
 from .environment import Environment
@@ -14,30 +18,62 @@ class Writer(writers.Writer):
 
     supported = ("markdown",)
 
-    def __init__(self, limit_version=None, receive_sections=None):
+    def __init__(
+        self, limit_version=None, receive_sections=None, limit_versions=None
+    ):
         super(Writer, self).__init__()
         self.limit_version = limit_version
         self.receive_sections = receive_sections
+        self.limit_versions = limit_versions
 
     def translate(self):
         translator = MarkdownTranslator(
-            self.document, self.limit_version, self.receive_sections
+            self.document,
+            self.limit_version,
+            self.receive_sections,
+            self.limit_versions,
         )
         self.document.walkabout(translator)
         self.output = translator.output_buf.getvalue()
 
 
+class _Buffer(list):
+    """Markdown output, kept as a list of strings until it's complete."""
+
+    write = list.append
+
+    def getvalue(self):
+        return "".join(self)
+
+
+class _Discard(object):
+    """Output for content that's not being written."""
+
+    @staticmethod
+    def write(text):
+        pass
+
+
+_discard = _Discard()
+
+
 class MarkdownTranslator(nodes.NodeVisitor):
-    def __init__(self, document, limit_version, receive_sections):
+    def __init__(
+        self, document, limit_version, receive_sections, limit_versions=None
+    ):
         super(MarkdownTranslator, self).__init__(document)
-        self.buf = self.output_buf = io.StringIO()
+        self.buf = self.output_buf = _Buffer()
         self.limit_version = limit_version
         self.receive_sections = receive_sections
         self.section_level = 1
         self.stack = []
 
+        if limit_version:
+            limit_versions = {limit_version}
+        self.limit_versions = limit_versions
+
         self._standalone_section_display = (
-            self.limit_version or self.receive_sections
+            self.limit_versions is not None or self.receive_sections
         )
         if self._standalone_section_display:
             self.disable_writing()
@@ -46,7 +82,7 @@ class MarkdownTranslator(nodes.NodeVisitor):
         self.buf = self.output_buf
 
     def disable_writing(self):
-        self.buf = io.StringIO()
+        self.buf = _discard
 
     def _detect_section_was_squashed_into_subtitle(self, document_node):
         # docutils converts a single section we generated into a "subtitle"
@@ -78,33 +114,39 @@ class MarkdownTranslator(nodes.NodeVisitor):
                 **subtitle_node.attributes
             )
 
-            # note we are taking the nodes from the document and moving them
-            # into the new section.   nodes have a "parent" which means that
-            # parent changes, which means we are mutating the internal
-            # state of the document node.  so use deepcopy() to avoid this
-            # side effect; deepcopy() for these nodes seems to not be a
-            # performance problem.
-            rebuild_our_lost_section.extend([n.deepcopy() for n in node[2:]])
-            rebuild_our_lost_section.walkabout(self)
+            # visit the rest of the document as though it were inside of
+            # the section; the nodes aren't moved into it, as that would
+            # change their parent, mutating the document
+            self.visit_section(rebuild_our_lost_section)
+            for subnode in rebuild_our_lost_section.children + node[2:]:
+                subnode.walkabout(self)
+            self.depart_section(rebuild_our_lost_section)
             raise nodes.SkipNode()
 
     def visit_standalone_version_node(self, node, version_string):
         """visit a section or document that has a changelog version string
         at the top"""
 
-        if self.limit_version and self.limit_version != version_string:
-            return
+        if (
+            self.limit_versions is not None
+            and version_string not in self.limit_versions
+        ):
+            # nothing within it would be written
+            raise nodes.SkipNode()
 
         self.section_level = 1
         self.enable_writing()
         if self.receive_sections:
-            self.buf = io.StringIO()
+            self.buf = _Buffer()
 
     def depart_standalone_version_node(self, node, version_string):
         """depart a section or document that has a changelog version string
         at the top"""
 
-        if self.limit_version and self.limit_version != version_string:
+        if (
+            self.limit_versions is not None
+            and version_string not in self.limit_versions
+        ):
             return
 
         if self.receive_sections:
@@ -195,24 +237,31 @@ class MarkdownTranslator(nodes.NodeVisitor):
         raise nodes.SkipNode()
 
     def visit_list_item(self, node):
-        self.stack.append(self.buf)
-        self.buf = io.StringIO()
+        # the item is written into the same buffer, then replaced with its
+        # stripped and indented form once complete
+        if self.buf is _discard:
+            self.stack.append(None)
+        else:
+            self.stack.append(len(self.buf))
 
     def depart_list_item(self, node):
-        popped = self.buf
-        self.buf = self.stack.pop(-1)
+        start = self.stack.pop(-1)
+        if start is None:
+            return
 
         indent_level = len(self.stack)
         indent_string = " " * 4 * indent_level
 
-        value = popped.getvalue().strip()
+        value = "".join(self.buf[start:]).strip()
+        del self.buf[start:]
 
-        lines = value.split("\n")
-        self.buf.write("\n" + indent_string + "-   ")
-        line = lines.pop(0)
-        self.buf.write(line + "\n")
-        for line in lines:
-            self.buf.write(indent_string + "    " + line + "\n")
+        self.buf.write(
+            "\n"
+            + indent_string
+            + "-   "
+            + value.replace("\n", "\n" + indent_string + "    ")
+            + "\n"
+        )
 
     def _visit_generic_node(self, node):
         pass
@@ -224,8 +273,43 @@ class MarkdownTranslator(nodes.NodeVisitor):
             raise AttributeError(name)
 
 
+def _limit_versions(target_filename, version, since, until):
+    """Return the index of the given file and the set of its versions to
+    be rendered, or None, None if all of them are."""
+
+    if not (version or since or until):
+        return None, None
+    index = scanner.VersionIndex(target_filename)
+    if version:
+        return index, {version}
+    return index, set(scanner.versions_in_range(index.versions, since, until))
+
+
+def _read_source(target_filename, index, versions):
+    if index is None:
+        with open(target_filename, encoding="utf-8") as handle:
+            return handle.read()
+    return index.excerpt(versions)
+
+
+def _settings_overrides(env, index):
+    settings_overrides = {
+        "changelog_env": env,
+        "report_level": 3,
+    }
+    if index is not None:
+        # see VersionIndex.excerpt()
+        settings_overrides["doctitle_xform"] = False
+    return settings_overrides
+
+
 def stream_changelog_sections(
-    target_filename, config_filename, receive_sections, version=None
+    target_filename,
+    config_filename,
+    receive_sections,
+    version=None,
+    since=None,
+    until=None,
 ):
     """Send individual changelog sections to a callable, one per version.
 
@@ -235,55 +319,253 @@ def stream_changelog_sections(
 
     Used for APIs that receive changelog sections per version.
 
+    If ``version`` is given, only that version is sent; otherwise
+    ``since`` and / or ``until`` limit the versions sent to a range, as
+    for :func:`.scanner.versions_in_range`.   Only the parts of the file
+    needed to render the versions asked for are parsed.
+
     """
     Environment.register(DefaultEnvironment)
 
     setup_docutils()
-    with open(target_filename, encoding="utf-8") as handle:
-        publish_string(
-            handle.read(),
-            source_path=target_filename,
-            writer=Writer(
-                limit_version=version, receive_sections=receive_sections
-            ),
-            settings_overrides={
-                "changelog_env": DefaultEnvironment(config_filename),
-                "report_level": 3,
-            },
-        )
+    env = DefaultEnvironment(config_filename)
+    index, versions = _limit_versions(target_filename, version, since, until)
+    publish_string(
+        _read_source(target_filename, index, versions),
+        source_path=target_filename,
+        writer=Writer(
+            receive_sections=receive_sections, limit_versions=versions
+        ),
+        settings_overrides=_settings_overrides(env, index),
+    )
+    env.close()
+
+
+def iter_changelog_sections(
+    target_filename, config_filename, since=None, until=None
+):
+    """Yield ``(version, markdown)`` for each changelog section, in the
+    order they appear in the file.
+
+    This is the same content as :func:`.stream_changelog_sections`
+    sends, however each version is parsed and rendered only as it's
+    asked for, so the first section is available without the rest of
+    the file having been processed, and stopping early skips rendering
+    the remaining versions altogether.
+
+    ``since`` and / or ``until`` limit the versions to a range, as for
+    :func:`.scanner.versions_in_range`.
+
+    """
+    Environment.register(DefaultEnvironment)
+
+    setup_docutils()
+    env = DefaultEnvironment(config_filename)
+    index = scanner.VersionIndex(target_filename)
+    versions = index.versions_in_range(since, until)
+
+    sections = []
+
+    def receive_sections(version_string, text):
+        sections.append((version_string, text))
+
+    try:
+        for version in versions:
+            # per-document state; the import index and fragment cache are
+            # kept on the environment and shared between versions
+            env.temp_data.clear()
+            publish_string(
+                index.excerpt({version}),
+                source_path=target_filename,
+                writer=Writer(
+                    receive_sections=receive_sections,
+                    limit_versions={version},
+                ),
+                settings_overrides=_settings_overrides(env, index),
+            )
+            while sections:
+                yield sections.pop(0)
+    finally:
+        env.close()
 
 
 def render_changelog_as_md(
-    target_filename, config_filename, version, sections_only
+    target_filename,
+    config_filename,
+    version,
+    sections_only,
+    since=None,
+    until=None,
 ):
 
     Environment.register(DefaultEnvironment)
 
     setup_docutils()
 
-    if sections_only:
+    env = DefaultEnvironment(config_filename)
+    _render_markdown(
+        target_filename, env, version, sections_only, since, until
+    )
+    env.close()
+
+
+def render_changelog_files_as_md(
+    filenames,
+    config_filename,
+    output_dir,
+    version=None,
+    sections_only=False,
+    since=None,
+    until=None,
+    jobs=None,
+):
+    """Render each of the given changelog files into a markdown file of
+    the same name in ``output_dir``.
 
-        def receive_sections(version_string, text):
-            print(text)
+    The files are rendered by a pool of ``jobs`` worker processes,
+    defaulting to one per CPU, each of which loads the configuration and
+    sets up docutils once.   Returns the list of markdown files written.
 
-    else:
-        receive_sections = None
+    Raises ValueError if two of the files have the same name, as they
+    would be rendered to the same markdown file; a file given more than
+    once is rendered once.
 
-    writer = Writer(limit_version=version, receive_sections=receive_sections)
-    settings_overrides = {
-        "changelog_env": DefaultEnvironment(config_filename),
-        "report_level": 3,
-    }
+    """
 
-    with open(target_filename, encoding="utf-8") as handle:
-        if receive_sections:
-            publish_string(
-                handle.read(),
-                source_path=target_filename,
-                writer=writer,
-                settings_overrides=settings_overrides,
+    rendered_from = {}
+    tasks = []
+    for target_filename in filenames:
+        output_filename = os.path.join(
+            output_dir,
+            os.path.splitext(os.path.basename(target_filename))[0] + ".md",
+        )
+        other = rendered_from.get(output_filename)
+        if other is not None:
+            if os.path.abspath(other) == os.path.abspath(target_filename):
+                continue
+            raise ValueError(
+                "%s and %s would both be rendered to %s"
+                % (other, target_filename, output_filename)
+            )
+        rendered_from[output_filename] = target_filename
+        tasks.append(
+            (
+                target_filename,
+                output_filename,
+                version,
+                sections_only,
+                since,
+                until,
             )
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs <= 1:
+        Environment.register(DefaultEnvironment)
+        setup_docutils()
+        env = DefaultEnvironment(config_filename)
+        return [_render_file(env, *task) for task in tasks]
+
+    with futures.ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(config_filename,)
+    ) as pool:
+        return list(pool.map(_render_file_in_worker, *zip(*tasks)))
+
+
+# the environment of a render_changelog_files_as_md() worker process
+_worker_env = None
+
+
+def _init_worker(config_filename):
+    global _worker_env
+
+    Environment.register(DefaultEnvironment)
+    setup_docutils()
+    _worker_env = DefaultEnvironment(config_filename)
+
+
+def _render_file_in_worker(*task):
+    return _render_file(_worker_env, *task)
+
+
+def _render_file(
+    env,
+    target_filename,
+    output_filename,
+    version,
+    sections_only,
+    since,
+    until,
+):
+    # per-document state; see iter_changelog_sections()
+    env.temp_data.clear()
+    _render_markdown(
+        target_filename,
+        env,
+        version,
+        sections_only,
+        since,
+        until,
+        output_filename,
+    )
+    # saved after each file, as pool workers can't be relied upon to
+    # run anything when they exit
+    env.close()
+    return output_filename
+
+
+def _render_markdown(
+    target_filename,
+    env,
+    version,
+    sections_only,
+    since,
+    until,
+    output_filename=None,
+):
+    """Render the given file as markdown, to the given output file or to
+    stdout."""
+
+    index, versions = _limit_versions(target_filename, version, since, until)
+    settings_overrides = _settings_overrides(env, index)
+
+    if index is not None:
+        source = io.StringIO(index.excerpt(versions))
+        source_path = target_filename
+    else:
+        source = open(target_filename, encoding="utf-8")
+        source_path = None
+
+    with source:
+        if sections_only:
+            if output_filename is not None:
+                output = open(output_filename, "w", encoding="utf-8")
+            else:
+                output = sys.stdout
+
+            def receive_sections(version_string, text):
+                print(text, file=output)
+
+            try:
+                publish_string(
+                    source.read(),
+                    source_path=target_filename,
+                    writer=Writer(
+                        receive_sections=receive_sections,
+                        limit_versions=versions,
+                    ),
+                    settings_overrides=settings_overrides,
+                )
+            finally:
+                if output is not sys.stdout:
+                    output.close()
         else:
             publish_file(
-                handle, writer=writer, settings_overrides=settings_overrides
+                source,
+                source_path=source_path,
+                destination_path=output_filename,
+                writer=Writer(limit_versions=versions),
+                settings_overrides=settings_overrides,
             )
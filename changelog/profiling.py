@@ -0,0 +1,74 @@
+"""Run a ``changelog`` command under cProfile and tracemalloc, for
+``--profile``.
+
+"""
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+
+def run_profiled(directory, name, fn, *args):
+    """Call ``fn(*args)``, writing a profile of the call into
+    ``directory``.
+
+    Three files are written, named for ``name`` along with the time and
+    process id:
+
+    * ``<name>.prof``, the cProfile statistics, for ``pstats``,
+      snakeviz and so on
+    * ``<name>.prof.txt``, the functions taking the most cumulative and
+      internal time
+    * ``<name>.malloc.txt``, the peak memory traced by tracemalloc and
+      the lines and files allocating the most memory that was still in
+      use at the end of the call
+
+    The files are written even if the call raises.   Tracing memory slows
+    Python down considerably, so the timings are relative rather than
+    absolute.
+
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    basename = os.path.join(
+        directory,
+        "%s-%s-%d" % (name, time.strftime("%Y%m%d-%H%M%S"), os.getpid()),
+    )
+
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        return profile.runcall(fn, *args)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profile.dump_stats(basename + ".prof")
+        with open(basename + ".prof.txt", "w") as handle:
+            stats = pstats.Stats(profile, stream=handle)
+            stats.sort_stats("cumulative").print_stats(50)
+            stats.sort_stats("tottime").print_stats(50)
+
+        with open(basename + ".malloc.txt", "w") as handle:
+            _write_allocations(handle, snapshot, current, peak)
+
+        sys.stderr.write(
+            "profile written to %s.{prof,prof.txt,malloc.txt}\n" % basename
+        )
+
+
+def _write_allocations(handle, snapshot, current, peak):
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+    handle.write(
+        "peak traced memory: %.1f KiB\n"
+        "traced memory at end: %.1f KiB\n" % (peak / 1024, current / 1024)
+    )
+    for key_type, limit in (("lineno", 50), ("filename", 25)):
+        handle.write("\ntop %d allocations by %s:\n" % (limit, key_type))
+        for stat in snapshot.statistics(key_type)[:limit]:
+            handle.write("%s\n" % stat)
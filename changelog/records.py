@@ -0,0 +1,101 @@
+"""The record kept for each change, per version it's rendered for."""
+import weakref
+
+# a set is dropped from here once no record uses it, so that a long
+# running process doesn't keep the sets of every change it has seen
+_interned = weakref.WeakValueDictionary()
+
+
+def frozen_set(items):
+    """Return a frozenset of the given items, shared with any other
+    equal set returned by this function that's still in use."""
+
+    items = frozenset(items)
+    # keyed on a tuple, as a key isn't weakly referenced; the set itself
+    # as the key would never go away
+    return _interned.setdefault(tuple(sorted(items)), items)
+
+
+class ChangeRecord(object):
+    """A change, as rendered for one version.
+
+    The tag, ticket, pull request and changeset collections are interned
+    frozensets; a change backported to several versions has a record for
+    each version, and those records share these collections as well as
+    their ``versions``, ``version_to_hash`` and ``sorted_versions``.
+
+    The body ``node`` of a backported change is also shared; see
+    :meth:`.take_node`.
+
+    Records also support dictionary-style access to their attributes, e.g.
+    ``rec["tags"]``, which is how :mod:`.generate_rst` and custom renderers
+    use them.
+
+    """
+
+    __slots__ = (
+        "hash",
+        "render_for_version",
+        "tags",
+        "tickets",
+        "pullreq",
+        "changeset",
+        "node",
+        "node_users",
+        "raw_text",
+        "type",
+        "title",
+        "sorted_tags",
+        "versions",
+        "version_to_hash",
+        "source_versions",
+        "sorted_versions",
+        "id",
+    )
+
+    def __init__(self, **kw):
+        self.type = "change"
+        for key, value in kw.items():
+            setattr(self, key, value)
+
+    def take_node(self):
+        """Return the body node of the change, to be placed in the
+        rendered document.
+
+        ``node_users`` is a one-item list, shared by the records using the
+        same node, of how many of them are yet to be rendered; the last
+        one rendered gets the node itself and the others get a copy, so
+        that the node is copied only as many times as there are other
+        versions to render it for.
+
+        """
+        self.node_users[0] -= 1
+        if self.node_users[0] > 0 or self.node.parent is not None:
+            return self.node.deepcopy()
+        return self.node
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def __repr__(self):
+        return "ChangeRecord(%s)" % ", ".join(
+            "%s=%r" % (key, self[key]) for key in self.keys() if key != "node"
+        )
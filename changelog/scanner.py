@@ -0,0 +1,456 @@
+"""Read ``.. changelog::`` and ``.. change::`` blocks, with their options,
+directly from changelog source text.
+
+This doesn't use docutils, so it's quick enough for tooling that only
+needs to know which changes there are and what versions, tags and
+tickets they have, rather than to render them.   Option fields are read
+the same way as by the directives themselves.
+
+"""
+import os
+import re
+
+from . import versionkey
+
+_CHANGELOG = re.compile(r"^\s*\.\. +changelog::")
+_CHANGE = re.compile(r"^(\s*)\.\. +change::(.*)$")
+_OPTION = re.compile(r" *\:(.+?)\:(?: +(.+))?")
+
+
+class Changelog(object):
+    """A ``.. changelog::`` directive."""
+
+    __slots__ = ("filename", "lineno", "version", "released", "options")
+
+    def __init__(self, filename, lineno, options):
+        self.filename = filename
+        self.lineno = lineno
+        self.version = options.get("version", "")
+        self.released = options.get("released", "")
+        self.options = options
+
+
+class Change(object):
+    """A ``.. change::`` directive, within the given :class:`.Changelog`
+    or a file of notes it includes."""
+
+    __slots__ = (
+        "filename",
+        "lineno",
+        "changelog",
+        "versions",
+        "tags",
+        "tickets",
+        "pullreq",
+        "changeset",
+        "options",
+        "text",
+    )
+
+    def __init__(self, filename, lineno, changelog, options, text):
+        self.filename = filename
+        self.lineno = lineno
+        self.changelog = changelog
+        self.options = options
+        self.text = text
+        self.versions = comma_set(options.get("versions", ""))
+        if changelog is not None and changelog.version:
+            self.versions.add(changelog.version)
+        self.tags = comma_set(options.get("tags", ""))
+        self.tickets = comma_set(options.get("tickets", ""))
+        self.pullreq = comma_set(options.get("pullreq", ""))
+        self.changeset = comma_set(options.get("changeset", ""))
+
+    @property
+    def version(self):
+        """The version the change is declared in."""
+
+        return self.changelog.version if self.changelog is not None else ""
+
+    @property
+    def summary(self):
+        """The first line of the change's text."""
+
+        for line in self.text:
+            if line.strip():
+                return line.strip()
+        return ""
+
+
+def scan_lines(lines):
+    """Yield ``(kind, start, end, options)`` for each ``.. changelog::``
+    directive header plus its options, and each ``.. change::`` directive,
+    in the given list of lines.
+
+    ``kind`` is ``"changelog"`` or ``"change"``; ``start`` and ``end`` are
+    the range of lines the directive occupies.
+
+    """
+
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx]
+        if _CHANGELOG.match(line):
+            start = idx
+            idx += 1
+            options = {}
+            while idx < len(lines) and lines[idx]:
+                m = _OPTION.match(lines[idx])
+                if not m:
+                    break
+                options[m.group(1)] = (m.group(2) or "").strip()
+                idx += 1
+            yield "changelog", start, idx, options
+            continue
+
+        m = _CHANGE.match(line)
+        if not m:
+            idx += 1
+            continue
+
+        indent = len(m.group(1))
+        end = idx + 1
+        while end < len(lines) and (
+            not lines[end].strip()
+            or len(lines[end]) - len(lines[end].lstrip()) > indent
+        ):
+            end += 1
+        yield "change", idx, end, change_options(
+            [m.group(2)] + lines[idx + 1 : end]
+        )
+        idx = end
+
+
+def change_options(content):
+    """Return the options given in the content of a ``.. change::``
+    directive, including its first line."""
+
+    return parse_options(_trim_top(content))[0]
+
+
+def parse_option(line):
+    """Return ``(name, value)`` if the given line is an option field, e.g.
+    ``:tags: orm, bug``, else None; ``value`` is ``""`` if there's none."""
+
+    m = _OPTION.match(line)
+    if m is None:
+        return None
+    return m.group(1), m.group(2) or ""
+
+
+def parse_options(content):
+    """Return ``(options, text)`` for the content of a ``.. changelog::``
+    or ``.. change::`` directive, being a dictionary of the option fields
+    it starts with and the rest of its lines.
+
+    ``content`` is a list of lines, or a docutils ``StringList``, and
+    ``text`` is a slice of it.   A first line which isn't an option, being
+    a value given on the same line as the directive, is skipped.
+
+    """
+
+    options = {}
+    idx = 0
+    for idx, line in enumerate(content, 1):
+        option = parse_option(line)
+        if option is not None:
+            options[option[0]] = option[1]
+        elif idx == 1 and line:
+            continue
+        else:
+            break
+    else:
+        idx = len(content)
+    return options, content[idx:]
+
+
+def _trim_top(content):
+    # leading blank lines are trimmed from directive content by docutils
+    while content and not content[0].strip():
+        content = content[1:]
+    return content
+
+
+def comma_set(text):
+    return set(re.split(r"\s*,\s*", text.strip())).difference([""])
+
+
+def read_lines(filename):
+    with open(filename, encoding="utf-8-sig") as handle:
+        return [line.expandtabs(8).rstrip() for line in handle]
+
+
+def scan_file(filename):
+    """Yield a :class:`.Changelog` or :class:`.Change` for each directive
+    in the given file, in order, including the changes in notes files
+    named by ``:include_notes_from:``."""
+
+    changelog = None
+    lines = read_lines(filename)
+    for kind, start, end, options in scan_lines(lines):
+        if kind == "change":
+            yield _change(filename, lines, start, end, changelog)
+            continue
+
+        changelog = Changelog(filename, start + 1, options)
+        yield changelog
+
+        notes_from = options.get("include_notes_from")
+        if not notes_from:
+            continue
+        notes_dir = os.path.join(os.path.dirname(filename), notes_from)
+        if not os.path.isdir(notes_dir):
+            continue
+        for fname in sorted(os.listdir(notes_dir)):
+            if not fname.endswith(".rst"):
+                continue
+            fpath = os.path.join(notes_dir, fname)
+            note_lines = read_lines(fpath)
+            for kind, start, end, options in scan_lines(note_lines):
+                if kind == "change":
+                    yield _change(fpath, note_lines, start, end, changelog)
+
+
+def _change(filename, lines, start, end, changelog):
+    first = _CHANGE.match(lines[start]).group(2)
+    options, text = parse_options(_trim_top([first] + lines[start + 1 : end]))
+    return Change(filename, start + 1, changelog, options, text)
+
+
+# the key of a version that's only a release number, e.g. "1.4", less
+# the release number and the version string
+_RELEASE_ONLY = versionkey.version_key("0")[1:-1]
+
+
+def _in_range(key, since, until):
+    if since is not None and key < since:
+        return False
+    if until is not None:
+        if until[1:] == _RELEASE_ONLY:
+            # "1.4" takes in every 1.4.x version
+            return key[0][: len(until[0])] <= until[0]
+        return key <= until
+    return True
+
+
+def versions_in_range(versions, since=None, until=None):
+    """Return those of the given versions that are within ``since`` /
+    ``until`` inclusive, newest first.
+
+    An ``until`` that's only a release number such as ``1.4`` includes
+    every ``1.4.x`` version.
+
+    """
+    since = versionkey.version_key(since)[:-1] if since else None
+    until = versionkey.version_key(until)[:-1] if until else None
+    return [
+        version
+        for version in versionkey.sort_versions(versions, reverse=True)
+        if _in_range(versionkey.version_key(version)[:-1], since, until)
+    ]
+
+
+def query(
+    filenames,
+    since=None,
+    until=None,
+    tags=(),
+    tickets=(),
+    released=None,
+):
+    """Yield ``(change, versions)`` for each change in the given files that
+    matches all of the given criteria.
+
+    ``versions`` is the list of versions the change applies towards that
+    are within ``since`` / ``until`` inclusive, and that are released or
+    unreleased if ``released`` is True or False, newest first; changes
+    without any such version aren't returned.   An ``until`` that's only
+    a release number such as ``1.4`` includes every ``1.4.x`` version.
+    ``tags`` and ``tickets`` each must all be present on a change.
+
+    Whether a version is released is decided by the ``:released:``
+    option of its ``.. changelog::``, so a change backported to a version
+    that's in another file needs that file to be given as well.
+
+    """
+
+    tags = set(tags)
+    tickets = set(tickets)
+
+    release_dates = {}
+    changes = []
+    for filename in filenames:
+        for item in scan_file(filename):
+            if isinstance(item, Changelog):
+                if item.version:
+                    release_dates[item.version] = item.released
+            elif tags <= item.tags and tickets <= item.tickets:
+                changes.append(item)
+
+    for change in changes:
+        versions = [
+            version
+            for version in versions_in_range(change.versions, since, until)
+            if released is None or released == bool(release_dates.get(version))
+        ]
+        if versions:
+            yield change, versions
+
+
+class VersionIndex(object):
+    """Where each ``.. changelog::`` block in a file begins and ends, so
+    that a document holding only some of its versions can be handed to
+    docutils rather than the whole file.
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lines = read_lines(filename)
+        self.blocks = []
+        block = None
+        for kind, start, end, options in scan_lines(self.lines):
+            if kind == "changelog":
+                block = _Block(start, end, options)
+                block.end = _directive_end(self.lines, start)
+                self.blocks.append(block)
+            elif (
+                block is not None
+                and start < block.end
+                and "versions" in options
+            ):
+                block.versioned_changes.append(
+                    (start, end, comma_set(options["versions"]))
+                )
+
+    @property
+    def versions(self):
+        """The versions of the file's ``.. changelog::`` blocks, in the
+        order they appear."""
+
+        return [block.version for block in self.blocks if block.version]
+
+    def versions_in_range(self, since=None, until=None):
+        """Return the versions within ``since`` / ``until``, as for
+        :func:`.versions_in_range`, in the order they appear."""
+
+        versions = self.versions
+        if since or until:
+            in_range = set(versions_in_range(versions, since, until))
+            versions = [version for version in versions if version in in_range]
+        return versions
+
+    def excerpt(self, versions):
+        """Return the text of the file with only the given versions' blocks
+        intact.
+
+        The blocks of other versions are removed, except for any changes
+        within them that also apply to one of the given versions, which
+        are kept along with the block's ``.. changelog::`` header.  Each
+        run of removed lines is replaced by a single blank line.
+
+        Without the other blocks, docutils may promote a lone remaining
+        section to be the document's title or subtitle; render the text
+        with the ``doctitle_xform`` setting turned off.
+
+        """
+
+        versions = set(versions)
+        lines = self.lines
+        keep = [True] * len(lines)
+        for block in self.blocks:
+            if block.version in versions:
+                continue
+            changes = [
+                (start, end)
+                for start, end, change_versions in block.versioned_changes
+                if change_versions & versions
+            ]
+            notes_line = block.notes_line(lines)
+            notes_apply = notes_line is not None and self._notes_apply(
+                block, versions
+            )
+
+            if not changes and not notes_apply:
+                for idx in range(block.start, block.end):
+                    keep[idx] = False
+                continue
+
+            for idx in range(block.header_end, block.end):
+                keep[idx] = False
+            for start, end in changes:
+                for idx in range(start, end):
+                    keep[idx] = True
+            if notes_line is not None and not notes_apply:
+                keep[notes_line] = False
+
+        # docutils takes some time over even blank lines, so these aren't
+        # kept for the sake of line numbers
+        text = []
+        removed = False
+        for line, kept in zip(lines, keep):
+            if kept:
+                text.append(line)
+                removed = False
+            elif not removed:
+                text.append("")
+                removed = True
+        return "\n".join(text)
+
+    def _notes_apply(self, block, versions):
+        notes_dir = os.path.join(
+            os.path.dirname(self.filename),
+            block.options["include_notes_from"],
+        )
+        if not os.path.isdir(notes_dir):
+            return False
+        for fname in os.listdir(notes_dir):
+            if not fname.endswith(".rst"):
+                continue
+            note_lines = read_lines(os.path.join(notes_dir, fname))
+            for kind, start, end, options in scan_lines(note_lines):
+                if kind == "change" and comma_set(
+                    options.get("versions", "")
+                ).intersection(versions):
+                    return True
+        return False
+
+
+class _Block(object):
+    __slots__ = (
+        "start",
+        "header_end",
+        "end",
+        "version",
+        "options",
+        "versioned_changes",
+    )
+
+    def __init__(self, start, header_end, options):
+        self.start = start
+        self.header_end = header_end
+        self.version = options.get("version", "")
+        self.options = options
+        self.versioned_changes = []
+
+    def notes_line(self, lines):
+        if "include_notes_from" not in self.options:
+            return None
+        for idx in range(self.start + 1, self.header_end):
+            m = _OPTION.match(lines[idx])
+            if m and m.group(1) == "include_notes_from":
+                return idx
+        return None
+
+
+def _directive_end(lines, start):
+    # the end of a directive's content, i.e. the next line that's no
+    # more indented than the directive itself
+    indent = len(lines[start]) - len(lines[start].lstrip())
+    end = start + 1
+    while end < len(lines) and (
+        not lines[end].strip()
+        or len(lines[end]) - len(lines[end].lstrip()) > indent
+    ):
+        end += 1
+    return end
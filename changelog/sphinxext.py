@@ -1,5 +1,10 @@
+import collections
+import json
 import os
 
+import sphinx
+from sphinx import addnodes
+from sphinx.environment import CONFIG_OK
 from sphinx.util import logging
 from sphinx.util.console import bold
 from sphinx.util.osutil import copyfile
@@ -9,6 +14,15 @@ from .docutils import ChangeLogDirective
 from .docutils import ChangeLogImportDirective
 from .docutils import make_ticket_link
 from .environment import Environment
+from .fragments import FragmentCache
+from .fragments import settings_signature
+from .imports import ImportIndex
+from .imports import signature
+from .imports import versioned_fingerprints
+from .indexes import anchor_map
+from .indexes import ticket_index
+from .timing import NULL as NULL_TIMER
+from .timing import Timer
 
 try:
     from sphinx.util.display import status_iterator
@@ -19,6 +33,14 @@ except ImportError:
 LOG = logging.getLogger(__name__)
 
 
+def _findall(node, condition):
+    # docutils 0.18 added findall(), deprecating traverse(); Sphinx 4
+    # still allows older versions
+    if hasattr(node, "findall"):
+        return node.findall(condition)
+    return node.traverse(condition)
+
+
 def _is_html(app):
     return app.builder.name in ("html", "readthedocs")
 
@@ -36,6 +58,12 @@ class SphinxEnvironment(Environment):
     def log_debug(self, msg, *args):
         LOG.debug(msg, *args)
 
+    @property
+    def log_debug_enabled(self):
+        # Sphinx's logger passes everything on to its handlers, which
+        # show debug messages from -vv onwards
+        return self.sphinx_env.app.verbosity > 1
+
     @property
     def temp_data(self):
         return self.sphinx_env.temp_data
@@ -72,9 +100,64 @@ class SphinxEnvironment(Environment):
     def changelog_render_changeset(self):
         return self.sphinx_env.config.changelog_render_changeset
 
+    @property
+    def docname(self):
+        return self.sphinx_env.docname
+
+    @property
+    def fragment_cache(self):
+        return getattr(self.sphinx_env.app, "changelog_fragment_cache", None)
+
+    @property
+    def import_index(self):
+        return _get_import_index(self.sphinx_env)
+
+    @property
+    def timer(self):
+        timer = getattr(self.sphinx_env, "changelog_timer", None)
+        if timer is None:
+            return NULL_TIMER
+        return timer.for_document(self.sphinx_env.docname)
+
+    def adopt_node(self, node):
+        # cross references resolve relative to the document they were
+        # parsed in
+        for xref in _findall(node, addnodes.pending_xref):
+            xref["refdoc"] = self.sphinx_env.docname
+
+    @property
+    def changelog_records(self):
+        return _get_changelog_records(self.sphinx_env).get(
+            self.sphinx_env.docname, {}
+        )
+
+    @property
+    def changelog_record_text(self):
+        # kept in the pickled environment; nothing here uses the text
+        return False
+
+    def note_changelog_records(self, version, records):
+        _get_changelog_records(self.sphinx_env).setdefault(
+            self.sphinx_env.docname, {}
+        )[version] = records
+
     def note_dependency(self, fpath):
         self.sphinx_env.note_dependency(fpath)
 
+    def note_directory_dependency(self, path):
+        # Sphinx itself only tracks files; see get_outdated_changelogs()
+        _get_notes_directories(self.sphinx_env).setdefault(
+            self.sphinx_env.docname, {}
+        )[path] = _list_notes(path)
+
+    def note_included(self, fpath):
+        self.sphinx_env.note_included(fpath)
+
+    def note_versioned_import(self, key, dependencies, fingerprints):
+        _get_changelog_imports(self.sphinx_env).setdefault(
+            self.sphinx_env.docname, {}
+        )[key] = (dependencies, signature(dependencies), fingerprints)
+
     def status_iterator(self, elements, message):
         return status_iterator(
             elements,
@@ -91,6 +174,245 @@ def add_stylesheet(app):
     app.add_css_file("changelog.css")
 
 
+def _get_import_index(sphinx_env):
+    if not hasattr(sphinx_env, "changelog_import_index"):
+        sphinx_env.changelog_import_index = ImportIndex()
+    return sphinx_env.changelog_import_index
+
+
+def _get_changelog_records(sphinx_env):
+    # docname -> version -> list of records rendered for that version
+    if not hasattr(sphinx_env, "changelog_records"):
+        sphinx_env.changelog_records = {}
+    return sphinx_env.changelog_records
+
+
+def _get_changelog_imports(sphinx_env):
+    # docname -> import key -> (dependencies, signature, fingerprints)
+    if not hasattr(sphinx_env, "changelog_imports"):
+        sphinx_env.changelog_imports = {}
+    return sphinx_env.changelog_imports
+
+
+def _get_notes_directories(sphinx_env):
+    # docname -> notes directory -> names of the .rst files in it
+    if not hasattr(sphinx_env, "changelog_notes_directories"):
+        sphinx_env.changelog_notes_directories = {}
+    return sphinx_env.changelog_notes_directories
+
+
+def _list_notes(path):
+    try:
+        return frozenset(
+            fname for fname in os.listdir(path) if fname.endswith(".rst")
+        )
+    except OSError:
+        return None
+
+
+def purge_changelog_records(app, env, docname):
+    for get_info in (
+        _get_changelog_records,
+        _get_changelog_imports,
+        _get_notes_directories,
+    ):
+        get_info(env).pop(docname, None)
+
+
+def get_outdated_changelogs(app, env, added, changed, removed):
+    """Return documents which read a notes directory where files have
+    been added or removed, or which import versioned changes from another
+    file where those changes have been modified for a version the
+    document renders."""
+
+    outdated = []
+    for docname, directories in _get_notes_directories(env).items():
+        if docname in changed or docname in removed:
+            continue
+        if any(
+            _list_notes(path) != fnames for path, fnames in directories.items()
+        ):
+            outdated.append(docname)
+
+    records = _get_changelog_records(env)
+    computed = {}
+    for docname, doc_imports in _get_changelog_imports(env).items():
+        if docname in changed or docname in removed or docname in outdated:
+            continue
+        versions = records.get(docname, {})
+        for key, (dependencies, sig, fingerprints) in doc_imports.items():
+            if signature(dependencies) == sig:
+                continue
+            if key not in computed:
+                computed[key] = versioned_fingerprints(*key)
+            if computed[key] is None:
+                outdated.append(docname)
+                break
+            new_dependencies, new_fingerprints = computed[key]
+            if any(
+                new_fingerprints.get(version) != fingerprints.get(version)
+                for version in versions
+            ):
+                outdated.append(docname)
+                break
+
+            # nothing we render has changed; don't look again until
+            # something else does
+            doc_imports[key] = (
+                new_dependencies,
+                signature(new_dependencies),
+                fingerprints,
+            )
+    return outdated
+
+
+def start_timer(app, env, docnames):
+    # timings are for this build only, not for documents read previously
+    env.changelog_timer = Timer() if app.config.changelog_timing else None
+
+
+def merge_changelog_info(app, env, docnames, other):
+    # called in the main process for each parallel read process that
+    # finishes, with "other" being that process' environment
+    _get_import_index(env).merge(_get_import_index(other))
+    for get_info in (
+        _get_changelog_records,
+        _get_changelog_imports,
+        _get_notes_directories,
+    ):
+        info = get_info(env)
+        other_info = get_info(other)
+        for docname in docnames:
+            if docname in other_info:
+                info[docname] = other_info[docname]
+
+    timer = getattr(env, "changelog_timer", None)
+    if timer is not None:
+        timer.merge(other.changelog_timer, docnames)
+
+    cache = app.changelog_fragment_cache
+    if cache is not None:
+        cache.merge(getattr(other, "changelog_new_fragments", ()))
+
+        # kept apart from the cache until reading is done, as read
+        # processes started from now on begin with a copy of it
+        app.changelog_merged_counts.update(
+            getattr(other, "changelog_fragment_counts", {})
+        )
+
+
+def collect_new_fragments(app, doctree):
+    # the fragment cache of a parallel read process goes away with the
+    # process; what it parsed is sent back to be merged along with the
+    # environment, as are its hits and misses
+    cache = app.changelog_fragment_cache
+    if cache is None:
+        return
+    new = cache.take_new()
+    if new:
+        if not hasattr(app.env, "changelog_new_fragments"):
+            app.env.changelog_new_fragments = []
+        app.env.changelog_new_fragments.extend(new)
+    if not hasattr(app.env, "changelog_fragment_counts"):
+        app.env.changelog_fragment_counts = collections.Counter()
+    app.env.changelog_fragment_counts.update(cache.take_counts())
+
+
+def finish_reading_fragments(app, env):
+    # new fragments are already merged, or in the cache of this process
+    # to begin with; the counts go back to the cache for its report.
+    # neither is to be pickled with the environment
+    if hasattr(env, "changelog_new_fragments"):
+        del env.changelog_new_fragments
+    cache = app.changelog_fragment_cache
+    if cache is not None:
+        cache.add_counts(app.changelog_merged_counts)
+        app.changelog_merged_counts.clear()
+        cache.add_counts(getattr(env, "changelog_fragment_counts", {}))
+    if hasattr(env, "changelog_fragment_counts"):
+        del env.changelog_fragment_counts
+
+
+def reset_import_index(app):
+    # imported changes are parsed with the configuration of the build
+    # that parsed them; when Sphinx reads every document again, e.g. for
+    # -E or a changed conf.py, parse the imported files again as well
+    if app.env.config_status != CONFIG_OK:
+        app.env.changelog_import_index = ImportIndex()
+
+
+def load_fragment_cache(app):
+    setting = app.config.changelog_fragment_cache
+    if not setting:
+        app.changelog_fragment_cache = None
+        return
+    app.changelog_merged_counts = collections.Counter()
+    if setting is True:
+        setting = os.path.join(app.doctreedir, "changelog_fragments.pickle")
+    app.changelog_fragment_cache = cache = FragmentCache(
+        setting,
+        app.config.changelog_fragment_cache_size,
+        settings_signature(
+            (
+                (item.name, item.value)
+                for item in app.config
+                if item.name.startswith("changelog_") and item.rebuild == "env"
+            ),
+            sphinx.__version__,
+        ),
+    )
+
+    # the parsed changes depend on the rest of the configuration too;
+    # when Sphinx reads every document again, e.g. for -E or a changed
+    # conf.py, parse the notes again as well
+    if app.env.config_status != CONFIG_OK:
+        cache.clear_changes()
+
+
+def save_fragment_cache(app, exception):
+    cache = app.changelog_fragment_cache
+    if cache is None or exception:
+        return
+    cache.save()
+    LOG.info(cache.report())
+
+
+def report_timings(app, exception):
+    timer = getattr(app.env, "changelog_timer", None)
+    if timer is None or exception:
+        return
+    for line in timer.summary():
+        LOG.info(line)
+
+    setting = app.config.changelog_timing
+    if isinstance(setting, str):
+        filename = os.path.join(app.outdir, setting)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w") as handle:
+            json.dump(timer.as_dict(), handle, indent=2)
+        LOG.info("changelog timings written to %s", filename)
+
+
+def write_indexes(app, exception):
+    if not _is_html(app) or exception:
+        return
+
+    # records are kept for every document, not only those read in this
+    # build, so the indexes are always complete
+    records = _get_changelog_records(app.env)
+    for filename, make_index in (
+        (app.config.changelog_ticket_index, ticket_index),
+        (app.config.changelog_anchor_map, anchor_map),
+    ):
+        if not filename:
+            continue
+        index = make_index(records, app.builder.get_target_uri)
+        path = os.path.join(app.builder.outdir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as handle:
+            json.dump(index, handle, separators=(",", ":"), sort_keys=True)
+
+
 def copy_stylesheet(app, exception):
     LOG.info(
         bold("The name of the builder is: %s" % app.builder.name), nonl=True
@@ -124,8 +446,32 @@ def setup(app):
     app.add_config_value("changelog_render_ticket", None, "env")
     app.add_config_value("changelog_render_pullreq", None, "env")
     app.add_config_value("changelog_render_changeset", None, "env")
+    app.add_config_value("changelog_fragment_cache", True, "")
+    app.add_config_value("changelog_fragment_cache_size", 5000, "")
+    app.add_config_value("changelog_timing", False, "", types=[bool, str])
+    app.add_config_value(
+        "changelog_ticket_index", "changelog_tickets.json", "html"
+    )
+    app.add_config_value(
+        "changelog_anchor_map", "changelog_anchors.json", "html"
+    )
     app.connect("builder-inited", add_stylesheet)
+    app.connect("builder-inited", load_fragment_cache)
+    app.connect("builder-inited", reset_import_index)
     app.connect("build-finished", copy_stylesheet)
+    app.connect("build-finished", save_fragment_cache)
+    app.connect("build-finished", report_timings)
+    app.connect("build-finished", write_indexes)
+    app.connect("env-before-read-docs", start_timer)
+    app.connect("doctree-read", collect_new_fragments)
+    app.connect("env-updated", finish_reading_fragments)
+    app.connect("env-purge-doc", purge_changelog_records)
+    app.connect("env-merge-info", merge_changelog_info)
+    app.connect("env-get-outdated", get_outdated_changelogs)
     app.add_role("ticket", make_ticket_link)
 
-    return {"parallel_read_safe": True, "parallel_write_safe": True}
+    return {
+        "env_version": 3,
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
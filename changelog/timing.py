@@ -0,0 +1,157 @@
+"""Wall time and call counts for each phase of changelog processing, such
+as parsing change bodies or rendering records, per document.
+
+"""
+import contextlib
+import time
+
+# the phases in the order they happen, for reporting
+PHASES = (
+    "fragment_io",
+    "nested_parse",
+    "hash",
+    "organize_by_section",
+    "render",
+    "summaries",
+)
+
+
+class Timer(object):
+    """Collect the time spent in each phase, per document.
+
+    Phases may be nested, such as the parsing of a ``.. change::`` body
+    within the parsing of its ``.. changelog::``; the time recorded for a
+    phase doesn't include that of the phases within it, so that the
+    phases of a document add up to the time spent on it altogether.
+
+    """
+
+    def __init__(self):
+        # docname -> {phase: [calls, seconds]}
+        self.documents = {}
+        self._stack = []
+
+    def __getstate__(self):
+        return {"documents": self.documents}
+
+    def __setstate__(self, state):
+        self.documents = state["documents"]
+        self._stack = []
+
+    def for_document(self, docname):
+        return _DocumentTimer(self, docname)
+
+    @contextlib.contextmanager
+    def _phase(self, docname, name):
+        # time spent in phases nested within this one
+        nested = [0.0]
+        self._stack.append(nested)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += elapsed
+            entry = self.documents.setdefault(docname, {}).setdefault(
+                name, [0, 0.0]
+            )
+            entry[0] += 1
+            entry[1] += elapsed - nested[0]
+
+    def merge(self, other, docnames):
+        """Take the timings of the given documents from another timer,
+        such as one from a parallel read."""
+
+        for docname in docnames:
+            if docname in other.documents:
+                self.documents[docname] = other.documents[docname]
+
+    def totals(self):
+        """Return ``{phase: [calls, seconds]}`` over all documents."""
+
+        totals = {}
+        for phases in self.documents.values():
+            for name, (calls, seconds) in phases.items():
+                entry = totals.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+        return totals
+
+    def summary(self, slowest=5):
+        """Return a list of lines reporting the total for each phase, and
+        the documents which took longest."""
+
+        totals = self.totals()
+        names = [name for name in PHASES if name in totals] + sorted(
+            set(totals).difference(PHASES)
+        )
+        lines = ["changelog timings, %d document(s):" % len(self.documents)]
+        lines.extend(
+            "  %-20s %8d calls %9.3fs"
+            % (name, totals[name][0], totals[name][1])
+            for name in names
+        )
+        lines.append(
+            "  %-20s %14s %9.3fs"
+            % ("total", "", sum(seconds for calls, seconds in totals.values()))
+        )
+
+        by_time = sorted(
+            (
+                (sum(seconds for calls, seconds in phases.values()), docname)
+                for docname, phases in self.documents.items()
+            ),
+            reverse=True,
+        )
+        if by_time:
+            lines.append("  slowest documents:")
+            lines.extend(
+                "    %9.3fs %s" % (seconds, docname)
+                for seconds, docname in by_time[:slowest]
+            )
+        return lines
+
+    def as_dict(self):
+        """Return the timings as a dictionary suitable for JSON."""
+
+        def phases(timings):
+            return {
+                name: {"calls": calls, "seconds": round(seconds, 6)}
+                for name, (calls, seconds) in timings.items()
+            }
+
+        return {
+            "phases": phases(self.totals()),
+            "documents": {
+                docname: phases(timings)
+                for docname, timings in sorted(self.documents.items())
+            },
+        }
+
+
+class _DocumentTimer(object):
+    __slots__ = ("timer", "docname")
+
+    def __init__(self, timer, docname):
+        self.timer = timer
+        self.docname = docname
+
+    def phase(self, name):
+        """Return a context manager which times a phase of processing."""
+
+        return self.timer._phase(self.docname, name)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    _context = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._context
+
+
+# used when timings aren't being collected
+NULL = _NullTimer()
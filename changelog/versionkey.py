@@ -0,0 +1,84 @@
+"""Sort keys for the version strings used in changelogs.
+
+A version string is parsed once into a tuple of plain ints and strings,
+which compares quickly and orders pre-releases the way they're released,
+e.g. ``1.4.0b1 < 1.4.0b2 < 1.4.0rc1 < 1.4.0 < 1.4.0.post1 < 1.4.1``.
+
+"""
+import functools
+import re
+
+_VERSION = re.compile(
+    r"^v?(\d+(?:\.\d+)*)"
+    r"(?:[.-]?(a|alpha|b|beta|c|rc|pre|preview)[.-]?(\d*))?"
+    r"(?:[.-]?(post|rev|r)[.-]?(\d*))?"
+    r"(?:[.-]?(dev)[.-]?(\d*))?$",
+    re.I,
+)
+
+_COMPONENT = re.compile(r"(\d+|[a-z]+)", re.I)
+
+_PRE_RELEASE = {
+    "a": 0,
+    "alpha": 0,
+    "b": 1,
+    "beta": 1,
+    "c": 2,
+    "rc": 2,
+    "pre": 2,
+    "preview": 2,
+}
+
+# rank of a final release among its pre-releases
+_FINAL = 3
+
+
+@functools.lru_cache(maxsize=4096)
+def version_key(version):
+    """Return a sort key for the given version string.
+
+    The key is ``(release, pre_rank, pre_number, post, dev, extra,
+    version)``; the version string itself comes last so that no two
+    different strings compare as equal.   Strings that aren't in a
+    recognized form are ordered by their leading numbers, then after the
+    final release of those numbers, by their remaining number and letter
+    components.
+
+    """
+    m = _VERSION.match(version.strip())
+    if m is None:
+        numbers = re.match(r"^v?([\d.]*)(.*)$", version.strip(), re.I)
+        release = tuple(int(n) for n in numbers.group(1).split(".") if n)
+        extra = tuple(
+            (0, int(c), "") if c.isdigit() else (1, 0, c.lower())
+            for c in _COMPONENT.findall(numbers.group(2))
+        )
+        return (release, _FINAL, 0, -1, 0, extra, version)
+
+    release, pre, pre_num, post, post_num, dev, dev_num = m.groups()
+    release = tuple(int(n) for n in release.split("."))
+
+    if pre:
+        pre_rank = _PRE_RELEASE[pre.lower()]
+        pre_num = int(pre_num or 0)
+    elif dev and not post:
+        # 1.4.0.dev1 comes before 1.4.0a1
+        pre_rank = -1
+        pre_num = 0
+    else:
+        pre_rank = _FINAL
+        pre_num = 0
+
+    post_num = int(post_num or 0) if post else -1
+
+    # a dev release comes before the release it's a dev release of
+    dev_num = int(dev_num or 0) - (1 << 30) if dev else 0
+
+    return (release, pre_rank, pre_num, post_num, dev_num, (), version)
+
+
+def sort_versions(versions, reverse=False):
+    """Return a list of the given version strings, sorted by
+    :func:`.version_key`."""
+
+    return sorted(versions, key=version_key, reverse=reverse)
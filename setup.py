@@ -39,7 +39,6 @@ setup(
     install_requires=[
         "Sphinx>=4.0.0",
         "docutils",
-        "looseversion",
     ],
     include_package_data=True,
     zip_safe=False,
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from changelog import config
+
+SETUP_CFG = """\
+[changelog]
+sections = general, orm, orm declarative
+inner_tag_sort =
+    feature
+    bug
+hide_sections_from_tags = yes
+hide_tags_in_entry = %s
+"""
+
+
+class ReadCfgTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _read(self, value):
+        filename = os.path.join(self.tmpdir.name, "setup.cfg")
+        with open(filename, "w") as handle:
+            handle.write(SETUP_CFG % value)
+        return config.read_config(filename)
+
+    def test_lists(self):
+        settings = self._read("false")
+        self.assertEqual(
+            settings["changelog_sections"],
+            ["general", "orm", "orm declarative"],
+        )
+        self.assertEqual(
+            settings["changelog_inner_tag_sort"], ["feature", "bug"]
+        )
+
+    def test_booleans(self):
+        for value, expected in (
+            ("false", False),
+            ("no", False),
+            ("False", False),
+            ("true", True),
+        ):
+            settings = self._read(value)
+            self.assertIs(settings["changelog_hide_tags_in_entry"], expected)
+            self.assertIs(settings["changelog_hide_sections_from_tags"], True)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from changelog import cmd
+
+CHANGELOG = """\
+==========
+Changelog
+==========
+
+.. changelog::
+    :version: 1.0.0
+    :released: January 1, 2020
+
+    .. change::
+        :tags: orm, bug
+        :tickets: 10
+
+        Fixed a thing.
+"""
+
+
+class GenerateMdFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmpdir.name, "out")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, *path):
+        filename = os.path.join(self.tmpdir.name, *path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w") as handle:
+            handle.write(CHANGELOG)
+        return filename
+
+    def test_no_files_matched(self):
+        pattern = os.path.join(self.tmpdir.name, "nothing_*.rst")
+        for argv in (
+            ["generate-md", pattern],
+            ["generate-md", pattern, "-o", self.output_dir],
+        ):
+            with self.assertRaises(SystemExit) as raised:
+                cmd.main(argv)
+            self.assertIn("no files matched", raised.exception.code)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_same_name_in_two_directories(self):
+        first = self._write("a", "changelog.rst")
+        second = self._write("b", "changelog.rst")
+        with self.assertRaisesRegex(ValueError, "both be rendered"):
+            cmd.main(
+                ["generate-md", first, second, "-o", self.output_dir]
+                + ["-j", "1"]
+            )
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_same_file_twice(self):
+        filename = self._write("changelog.rst")
+        cmd.main(
+            ["generate-md", filename, os.path.join(self.tmpdir.name, "*.rst")]
+            + ["-o", self.output_dir, "-j", "1"]
+        )
+        self.assertEqual(os.listdir(self.output_dir), ["changelog.md"])
@@ -0,0 +1,105 @@
+"""Check that the ``changelog`` commands which don't render anything
+don't import Sphinx or docutils."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHANGELOG = """\
+==========
+Changelog
+==========
+
+.. changelog::
+    :version: 1.1.0
+    :include_notes_from: unreleased
+
+.. changelog::
+    :version: 1.0.0
+    :released: January 1, 2020
+
+    .. change::
+        :tags: orm, bug
+        :tickets: 10
+
+        Fixed a thing.
+"""
+
+NOTE = """\
+.. change::
+    :tags: sql, feature
+    :tickets: 11
+
+    Added a thing.
+"""
+
+RUN = """
+import json
+import sys
+
+from changelog import cmd
+
+cmd.main(sys.argv[2:])
+loaded = sorted(
+    name
+    for name in sys.modules
+    if name.split(".")[0] in ("sphinx", "docutils")
+)
+with open(sys.argv[1], "w") as handle:
+    json.dump(loaded, handle)
+"""
+
+
+class CommandImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "changelog.rst")
+        with open(self.filename, "w") as handle:
+            handle.write(CHANGELOG)
+        os.mkdir(os.path.join(self.tmpdir.name, "unreleased"))
+        with open(
+            os.path.join(self.tmpdir.name, "unreleased", "11.rst"), "w"
+        ) as handle:
+            handle.write(NOTE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _modules_loaded(self, *argv):
+        # a new interpreter, so that nothing is imported already
+        result = os.path.join(self.tmpdir.name, "modules.json")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = ROOT
+        proc = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(RUN), result] + list(argv),
+            env=env,
+            cwd=self.tmpdir.name,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(proc.returncode, 0)
+        with open(result) as handle:
+            return json.load(handle), proc.stdout
+
+    def test_release_notes_dry_run(self):
+        loaded, output = self._modules_loaded(
+            "release-notes",
+            self.filename,
+            "1.1.0",
+            "June 1, 2021",
+            "--dry-run",
+        )
+        self.assertIn("Added a thing.", output)
+        self.assertEqual(loaded, [])
+
+    def test_query(self):
+        loaded, output = self._modules_loaded(
+            "query", self.filename, "-t", "bug"
+        )
+        self.assertIn("10", output)
+        self.assertEqual(loaded, [])
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from changelog import cmd
+
+CHANGELOG = """\
+==========
+Changelog
+==========
+
+.. changelog::
+    :version: 1.0.0
+    :include_notes_from: unreleased
+"""
+
+NOTE = """\
+.. change::
+    :tags: orm, bug
+    :tickets: %d
+
+    Fixed a thing.
+"""
+
+
+class ReleaseNotesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.filename = os.path.join(self.tmpdir.name, "changelog.rst")
+        self._write("changelog.rst", CHANGELOG)
+        self._write(os.path.join("unreleased", "10.rst"), NOTE % 10)
+        self._write(os.path.join("unreleased", "11.rst"), NOTE % 11)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def _write(self, name, text):
+        filename = os.path.join(self.tmpdir.name, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w") as handle:
+            handle.write(text)
+
+    def _git(self, *args):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t"] + list(args),
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def _release(self):
+        cmd.main(["release-notes", self.filename, "1.0.0", "May 1, 2020"])
+        with open(self.filename) as handle:
+            return handle.read()
+
+    def test_untracked_note(self):
+        self._git("init", "-q")
+        self._git("add", "changelog.rst", os.path.join("unreleased", "10.rst"))
+        self._git("commit", "-q", "-m", "notes")
+
+        merged = self._release()
+        self.assertIn(":released: May 1, 2020", merged)
+        self.assertIn(":tickets: 10", merged)
+        self.assertIn(":tickets: 11", merged)
+        self.assertFalse(os.path.exists("unreleased"))
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "unreleased"],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        self.assertEqual(status, "D  unreleased/10.rst\n")
+
+    def test_not_a_repository(self):
+        ceiling = {"GIT_CEILING_DIRECTORIES": self.tmpdir.name}
+        with mock.patch.dict(os.environ, ceiling):
+            with self.assertRaises(SystemExit) as raised:
+                self._release()
+        self.assertIn("release-notes: error", raised.exception.code)
+        with open(self.filename) as handle:
+            self.assertEqual(handle.read(), CHANGELOG)
+        self.assertEqual(
+            sorted(os.listdir("unreleased")), ["10.rst", "11.rst"]
+        )